@@ -9,6 +9,7 @@ from datetime import datetime as dt
 from glob import glob
 from collections import namedtuple, OrderedDict
 from json import dumps
+from glaes.core import geometry
 
 #################################################################
 ## DEFINE SOURCES
@@ -1180,7 +1181,7 @@ def edgesByProximity(reg, geom, distances):
         def doGrow(geom, dist):
             if dist > 0:
                 if isinstance(geom,list) or isinstance(geom, filter):
-                    grown = [g.Buffer(dist) for g in geom] 
+                    grown = geometry.buffer(geom, dist) 
                 else:
                     grown = geom.Buffer(dist) 
             else:
@@ -1262,14 +1263,9 @@ def geomExtractor( extent, source, where=None, simplify=None ):
             geoms.append( geom.Clone() )
 
     if not simplify is None: 
-        newGeoms = [g.SimplifyPreserveTopology(simplify) for g in geoms]
-        for g, ng in zip(geoms, newGeoms):
-            if "LINE" in ng.GetGeometryName():
-                test = ng.Length()/g.Length()
-            else: 
-                test = ng.Area()/g.Area()
-
-            if test<0.97:
+        newGeoms = geometry.simplify(geoms, simplify)
+        for test in geometry.deviation(geoms, newGeoms):
+            if np.isnan(test) or test<0.97: # NaN means the original was degenerate
                 raise RuntimeError("ERROR: Simplified geometry is >3% different from the original")
             elif test<0.99:
                 print("WARNING: simplified geometry is slightly different from the original")
@@ -2,16 +2,25 @@ import geokit as gk
 import re
 import numpy as np
 from os.path import isfile
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+import json
+import logging
+from time import perf_counter
 from warnings import warn
 import pandas as pd
 from osgeo import gdal
 
 
-from .util import GlaesError
-from .priors import Priors, PriorSource
+from .util import GlaesError, gridAligned, indicateInBlocks, indicateAdaptive, compileValueLookup, windowOffsets, readWindow
+from .priors import Priors, PriorSource, PriorCube, PriorSlack
+from .vectors import indicateFeaturesStreamed, clipBuffers, streamFeatures, estimateBufferCosts, chooseBufferMethod, simplifiedSource, indexedSource
+from . import geometry
+from .coverage import indicateFeaturesExact
 
 Areas = namedtuple('Areas', "coordinates geoms")
+_log = logging.getLogger("glaes")
+
+IndexMap = namedtuple('IndexMap', "srs x y cx cy")
 
 ###############################
 # Make an Exclusion Calculator
@@ -124,7 +133,7 @@ class ExclusionCalculator(object):
         "woodland_deciduous_proximity": (None, 300),
         "woodland_mixed_proximity": (None, 300)}
 
-    def __init__(s, region, srs=3035, pixelRes=100, where=None, padExtent=0, initialValue=True, **kwargs):
+    def __init__(s, region, srs=3035, pixelRes=100, where=None, padExtent=0, initialValue=True, regionPack=None, **kwargs):
         """Initialize the ExclusionCalculator
 
         Parameters:
@@ -184,6 +193,11 @@ class ExclusionCalculator(object):
                 by warping (using the 'near' algorithm) from the given raster, and excluding 
                 pixels with a value of 0 
 
+        regionPack : str; optional
+            A path to a region pack (see ExclusionCalculator.buildRegionPack) 
+            to serve Prior exclusions from
+            * The pack must have been built for the same region and grid
+
         kwargs:
             * Keyword arguments are passed on to a call to geokit.RegionMask.load
             * Only take effect when the 'region' argument is a string
@@ -248,6 +262,14 @@ class ExclusionCalculator(object):
         s._itemCoords = None
         s._areas = None
 
+        # Mapping from region pixels to Prior coordinates (see buildPriorIndexMap)
+        s._priorIndexMap = None
+
+        # Pre-warped Prior indices (see buildRegionPack)
+        s._regionPack = None
+        if regionPack is not None:
+            s.loadRegionPack(regionPack)
+
     def save(s, output, threshold=None, **kwargs):
         """Save the current availability matrix to a raster file
 
@@ -554,8 +576,31 @@ class ExclusionCalculator(object):
             * Units are defined by the srs used to initialize the ExclusionCalculator"""
         return s._availability[s.region.mask].sum(dtype=np.int64) * s.region.pixelWidth * s.region.pixelHeight / 100
 
+    def _applyAreas(s, areas, invert=False, mode="exclude", unchanged=None):
+        """Applies a matrix of indicated areas (0-100) to the availability matrix
+
+        * Pixels flagged in the boolean matrix 'unchanged' keep their current
+          availability, regardless of 'invert' and 'mode'
+        """
+        if not unchanged is None:
+            previous = s._availability.copy()
+
+        # exclude the indicated area from the total availability
+        if mode == "exclude":
+            s._availability = np.min(
+                [s._availability, areas if invert else 100 - areas], axis=0)
+        elif mode == "include":
+            s._availability = np.max(
+                [s._availability, 100 - areas if invert else areas], axis=0)
+            s._availability[~s.region.mask] = 0
+        else:
+            raise GlaesError("mode must be 'exclude' or 'include'")
+
+        if not unchanged is None:
+            s._availability[unchanged] = previous[unchanged]
+
     # General excluding functions
-    def excludeRasterType(s, source, value=None, buffer=None, resolutionDiv=1, prewarp=False, invert=False, mode="exclude", **kwargs):
+    def excludeRasterType(s, source, value=None, buffer=None, resolutionDiv=1, prewarp=False, invert=False, mode="exclude", blockRows=None, workers=1, adaptive=False, **kwargs):
         """Exclude areas based off the values in a raster datasource
 
         Parameters:
@@ -598,6 +643,20 @@ class ExclusionCalculator(object):
                   - 29
                   - 33
                   - Everything above 40, including 40
+            * For integer sources of up to 16 bits (such as CLC), the value is 
+              compiled into a lookup table over all possible pixel values and
+              applied in a single pass (see glaes.core.util.compileValueLookup)
+              - This applies when no 'buffer' is given, 'resolutionDiv' is 1, 
+                and the source lies on the region's grid (or 'resampleAlg' is
+                given as 'near')
+            * If ( low, high ) where either boundary is a matrix matching the
+              RegionMask's shape, or a raster datasource (such as one created
+              with ExclusionCalculator.thresholdRaster), the boundaries vary
+              from pixel to pixel
+              - A NaN boundary means that the pixel's availability is left
+                unchanged (also when 'invert' is True)
+              - The source is sampled at the RegionMask's pixels, so 'buffer'
+                and 'resolutionDiv' are not supported in this case
 
         buffer : float; optional
             A buffer region to add around the indicated pixels
@@ -629,6 +688,32 @@ class ExclusionCalculator(object):
             * If 'include', then the indicated pixel are added back into the
               availability matrix
 
+        blockRows : int or 'auto'; optional
+            When given along with a 'resolutionDiv' above 1, the region is 
+            processed in blocks of this many rows, each of which is 
+            supersampled and reduced to pixel fractions before the next one
+            * If 'auto', blocks are sized so that peak memory is about that of
+              'resolutionDiv=1'
+            * Blocks are padded by the buffer distance, so the result matches 
+              that of processing the whole region at once
+            * See glaes.core.util.indicateInBlocks
+
+        workers : int; optional
+            The number of blocks to process in parallel threads, when 
+            'blockRows' is given
+            * Only used when 'source' is a path
+
+        adaptive : bool; optional
+            If True, and 'resolutionDiv' is above 1, the indication is first made
+            at the native resolution, and only pixels along the boundaries of 
+            the indicated areas (including their buffers) are re-evaluated at 
+            the finer resolution
+            * Partial pixel accuracy then costs roughly in proportion to the 
+              length of the boundaries rather than the region's area
+            * Areas too small to cover any pixel center at the native 
+              resolution can be missed
+            * See glaes.core.util.indicateAdaptive
+
         kwargs
             * All other keyword arguments are passed on to a call to
               geokit.RegionMask.indicateValues
@@ -644,22 +729,35 @@ class ExclusionCalculator(object):
 
             source = s.region.warp(source, returnMatrix=False, **prewarpArgs)
 
+        # Compare against per-pixel thresholds in a single pass
+        if s._isSpatialValue(value):
+            if not buffer is None or resolutionDiv != 1:
+                raise GlaesError("'buffer' and 'resolutionDiv' are not supported with per-pixel thresholds")
+
+            data = s.region.warp(source, resampleAlg=kwargs.pop("resampleAlg", "near"), applyMask=False, **kwargs)
+            value = s._spatialValue(value)
+            areas = s._indicateIndices(data, value)
+            s._applyAreas(areas, invert=invert, mode=mode, unchanged=s._undefinedThresholds(value))
+            return
+
+        # Evaluate integer categorical sources through a compiled lookup table
+        if buffer is None and resolutionDiv == 1 and not value is None:
+            areas = s._lookupCategories(source, value, **kwargs)
+            if not areas is None:
+                s._applyAreas(areas, invert=invert, mode=mode)
+                return
+
+        def indicate(region, div=resolutionDiv):
+            return region.indicateValues(source, value, buffer=buffer, resolutionDiv=div, applyMask=False, **kwargs)
+
         # Indicate on the source
-        areas = (s.region.indicateValues(source, value, buffer=buffer,
-                                         resolutionDiv=resolutionDiv, applyMask=False, **kwargs) * 100).astype(np.uint8)
+        areas = (s._indicateSupersampled(indicate, resolutionDiv, buffer, blockRows, workers, adaptive,
+                                         threadSafe=isinstance(source, str)) * 100).astype(np.uint8)
 
         # exclude the indicated area from the total availability
-        if mode == "exclude":
-            s._availability = np.min(
-                [s._availability, areas if invert else 100 - areas], axis=0)
-        elif mode == "include":
-            s._availability = np.max(
-                [s._availability, 100 - areas if invert else areas], axis=0)
-            s._availability[~s.region.mask] = 0
-        else:
-            raise GlaesError("mode must be 'exclude' or 'include'")
+        s._applyAreas(areas, invert=invert, mode=mode)
 
-    def excludeVectorType(s, source, where=None, buffer=None, bufferMethod='geom', invert=False, mode="exclude", resolutionDiv=1, **kwargs):
+    def excludeVectorType(s, source, where=None, buffer=None, bufferMethod='geom', invert=False, mode="exclude", resolutionDiv=1, bufferField=None, chunkSize=None, cacheDir=None, simplify=None, exact=False, blockRows=None, workers=1, adaptive=False, **kwargs):
         """Exclude areas based off the features in a vector datasource
 
         Parameters:
@@ -678,24 +776,45 @@ class ExclusionCalculator(object):
                 wanted, the correct statement would be:
                     where="type='protected'"
 
-        buffer : float; optional
+        buffer : float, str, or dict; optional
             A buffer region to add around the indicated pixels
             * Units are in the RegionMask's srs
+            * If str, the name of a numeric attribute holding each feature's 
+              buffer distance
+            * If dict, a mapping from the values of the 'bufferField' attribute
+              to buffer distances
+              - Features whose value is not in the mapping are ignored
+            * When the distance varies by feature, all features are rasterized
+              once and each distinct distance is applied with a distance 
+              transform of the pixels it labels, so 'bufferMethod' has no effect
+              and the result resembles the 'area' method
+              - Additional keyword arguments are not supported in this case
 
         bufferMethod : str; optional
             An indicator determining the method to use when buffereing
-            * Options are: 'geom' and 'area'
+            * Options are: 'geom', 'area' and 'auto'
             * If 'geom', the function will attempt to grow each of the geometries
               directly using the ogr library
               - This can fail sometimes when the geometries are particularly
                 complex or if some of the geometries are not valid (as in, they
                 have self-intersections)
+              - Geometries are clipped to the region's extent (padded by the 
+                buffer distance) before growing them, so that huge geometries
+                near the region remain cheap to buffer
             * If 'area', the function will first rasterize the raw geometries and
               will then apply the buffer to the indicated pixels
               - This is the safer option although is not as accurate as the 'geom'
                 option since it does not capture the exact edges of the geometries
               - This method can be made more accurate by increasing the
                 'resolutionDiv' input
+            * If 'auto', the cost of each method is estimated from the number
+              of features and vertices near the region, the buffer distance,
+              and the number of pixels, and the cheapest one is used (see
+              glaes.core.vectors.estimateBufferCosts)
+              - 'area' is only preferred when it is much cheaper, unless the
+                buffer spans many pixels
+              - The choice, as well as the estimated and actual timings, are 
+                logged to the "glaes" logger at the INFO level
 
         resolutionDiv : int; optional
             The factor by which to divide the RegionMask's native resolution
@@ -710,6 +829,75 @@ class ExclusionCalculator(object):
             * If 'include', then the indicated pixel are added back into the
               availability matrix
 
+        bufferField : str; optional
+            The attribute to look up in 'buffer', when it is given as a dict
+
+        chunkSize : int; optional
+            When given, the source is ingested through a spatially indexed copy
+            (see glaes.core.vectors.indexedSource), and only the features near
+            the region are streamed and rasterized, 'chunkSize' features at a 
+            time
+            * Use this for very large (e.g. continental) vector sources, so that
+              memory use scales with the local feature density instead of the
+              size of the source
+            * Additional keyword arguments are not supported in this case, and
+              raise a GlaesError
+
+        cacheDir : str; optional
+            The directory in which to keep spatially indexed (or simplified)
+            copies of sources
+            * Only used together with 'chunkSize' or 'simplify'
+
+        simplify : float; optional
+            When given, the source's geometries are first simplified (while 
+            preserving topology) with a tolerance of 'simplify' times the 
+            pixel size divided by 'resolutionDiv'
+            * No vertex moves by more than this tolerance, so values such as
+              0.1-0.5 have little effect on the result, while greatly reducing
+              the number of vertices of very detailed sources (such as 
+              coastlines or protected area boundaries)
+            * The simplified copy is cached per source and tolerance (see
+              glaes.core.vectors.simplifiedSource)
+            * Only applies when 'source' is a path
+
+        exact : bool; optional
+            If True, the exact fraction of each pixel covered by the (buffered)
+            features is computed analytically at the native resolution, so 
+            that partially covered pixels become partially available
+            * This replaces supersampling with 'resolutionDiv', whose cost 
+              grows with resolutionDiv^2, and 'bufferMethod' is not used
+            * Lines and points require a buffer
+            * Feature-dependent buffers, a 'resolutionDiv' other than 1, and 
+              additional keyword arguments are not supported, and raise a 
+              GlaesError
+            * See glaes.core.coverage.indicateFeaturesExact
+
+        blockRows : int or 'auto'; optional
+            When given along with a 'resolutionDiv' above 1, the region is 
+            processed in blocks of this many rows, each of which is 
+            supersampled and reduced to pixel fractions before the next one
+            * If 'auto', blocks are sized so that peak memory is about that of
+              'resolutionDiv=1'
+            * Blocks are padded by the buffer distance, so the result matches 
+              that of processing the whole region at once
+            * See glaes.core.util.indicateInBlocks
+
+        workers : int; optional
+            The number of blocks to process in parallel threads, when 
+            'blockRows' is given
+            * Only used when 'source' is a path
+
+        adaptive : bool; optional
+            If True, and 'resolutionDiv' is above 1, the indication is first made
+            at the native resolution, and only pixels along the boundaries of 
+            the indicated areas (including their buffers) are re-evaluated at 
+            the finer resolution
+            * Partial pixel accuracy then costs roughly in proportion to the 
+              length of the boundaries rather than the region's area
+            * Areas too small to cover any pixel center at the native 
+              resolution can be missed
+            * See glaes.core.util.indicateAdaptive
+
         kwargs
             * All other keyword arguments are passed on to a call to
               geokit.RegionMask.indicateFeatures
@@ -721,20 +909,247 @@ class ExclusionCalculator(object):
             source = source.generateVectorFromEdge(
                 s.region.extent, edgeIndex=edgeI)
 
+        # Simplify detailed geometries down to the pixel size
+        if not simplify is None and isinstance(source, str):
+            tolerance = simplify * min(s.region.pixelWidth, s.region.pixelHeight) / resolutionDiv
+            source = simplifiedSource(source, tolerance, s.srs, cacheDir=cacheDir)
+
+        # Compute exact fractional coverage at the native resolution
+        if exact:
+            if isinstance(buffer, (str, dict)):
+                raise GlaesError("Feature-dependent buffers are not supported with exact=True")
+            if resolutionDiv != 1:
+                raise GlaesError("'resolutionDiv' is not used with exact=True, since coverage is computed exactly")
+            if kwargs:
+                raise GlaesError("Unsupported arguments with exact=True: %s" % ", ".join(kwargs))
+
+            coverage = indicateFeaturesExact(s.region, source, where=where, buffer=buffer)
+            areas = np.round(coverage * 100).astype(np.uint8)
+            s._applyAreas(areas, invert=invert, mode=mode)
+            return
+
+        # Choose the buffering method from an estimate of the costs
+        if bufferMethod == 'auto':
+            if buffer is None or buffer == 0 or isinstance(buffer, (str, dict)):
+                bufferMethod = 'geom'
+            else:
+                clipping = isinstance(source, str)
+                costs = estimateBufferCosts(s.region, source, buffer, where=where, resolutionDiv=resolutionDiv)
+                choice = chooseBufferMethod(costs, max(s.region.pixelWidth, s.region.pixelHeight)/resolutionDiv,
+                                            buffer, clipping=clipping)
+                _log.info("excludeVectorType: bufferMethod 'auto' chose '%s' for %d features with ~%d vertices "
+                          "(estimated seconds: geom=%.3g, clipped=%.3g, area=%.3g)", choice, costs["features"],
+                          costs["vertices"], costs["geom"], costs["clipped"], costs["area"])
+
+                start = perf_counter()
+                s.excludeVectorType(source, where=where, buffer=buffer, bufferMethod='area' if choice == 'area' else 'geom',
+                                    invert=invert, mode=mode, resolutionDiv=resolutionDiv, chunkSize=chunkSize,
+                                    cacheDir=cacheDir, blockRows=blockRows, workers=workers, adaptive=adaptive, **kwargs)
+                _log.info("excludeVectorType: '%s' buffering took %.3gs (estimated %.3gs)",
+                          choice, perf_counter()-start, costs[choice])
+                return
+
+        # Stream large sources through a spatial index, and clip geometries 
+        # before buffering them
+        streamed = not chunkSize is None and isinstance(source, str) and not isinstance(buffer, (str, dict))
+        clipped = not buffer is None and bufferMethod == 'geom' and isinstance(source, str) and \
+            not isinstance(buffer, (str, dict))
+        if streamed:
+            if kwargs:
+                raise GlaesError("Unsupported arguments when streaming with 'chunkSize': %s" % ", ".join(kwargs))
+
+            # Resolve the indexed copy once, rather than once per block
+            source = indexedSource(source, cacheDir)
+
+            def indicate(region, div=resolutionDiv):
+                return indicateFeaturesStreamed(region, source, where=where, buffer=buffer, bufferMethod=bufferMethod,
+                                                resolutionDiv=div, chunkSize=chunkSize, indexed=False)
+        elif clipped:
+            # Only the buffering is done here, the rasterization is left to geokit
+            def indicate(region, div=resolutionDiv):
+                margin = max(region.pixelWidth, region.pixelHeight)/div
+                geoms = []
+                for chunk in streamFeatures(source, region.extent.pad(max(buffer, 0)), where=where, chunkSize=None, srs=region.srs):
+                    geoms.extend(g for g in clipBuffers(chunk, region.extent, buffer, margin=margin) if not g is None)
+
+                if len(geoms) == 0:
+                    return np.zeros(region.mask.shape)
+                return region.indicateGeoms(geoms, resolutionDiv=div, applyMask=False, **kwargs)
+        elif isinstance(buffer, (str, dict)):
+            # Apply feature-dependent buffers in a single pass
+            if kwargs:
+                raise GlaesError("Unsupported arguments for feature-dependent buffers: %s" % ", ".join(kwargs))
+            areas = s._indicateFeatureBuffers(source, where, buffer, bufferField, resolutionDiv)
+            s._applyAreas(areas, invert=invert, mode=mode)
+            return
+        else:
+            def indicate(region, div=resolutionDiv):
+                return region.indicateFeatures(source, where=where, buffer=buffer, resolutionDiv=div,
+                                               bufferMethod=bufferMethod, applyMask=False, **kwargs)
+
         # Indicate on the source
-        areas = (s.region.indicateFeatures(source, where=where, buffer=buffer, resolutionDiv=resolutionDiv,
-                                           bufferMethod=bufferMethod, applyMask=False, **kwargs) * 100).astype(np.uint8)
+        areas = (s._indicateSupersampled(indicate, resolutionDiv, buffer, blockRows, workers, adaptive,
+                                         threadSafe=isinstance(source, str)) * 100).astype(np.uint8)
 
         # exclude the indicated area from the total availability
-        if mode == "exclude":
-            s._availability = np.min(
-                [s._availability, areas if invert else 100 - areas], axis=0)
-        elif mode == "include":
-            s._availability = np.max(
-                [s._availability, 100 - areas if invert else areas], axis=0)
-            s._availability[~s.region.mask] = 0
+        s._applyAreas(areas, invert=invert, mode=mode)
+
+    def _lookupCategories(s, source, value, resampleAlg=None, **kwargs):
+        """Indicates (0-100) the pixels of an integer raster source which match
+        a value expression, using a compiled lookup table
+
+        * Applies to single band sources of (up to) 16 bit integers
+        * When the source lies on the region's grid, its pixels are read 
+          directly, otherwise this only applies when 'resampleAlg' is 'near',
+          in which case the source is warped with nearest-neighbor resampling
+          - Other resampling schemes (such as 'mode') aggregate the indication
+            rather than the categories, so they are left to the general path
+        * Pixels outside of the source are never indicated
+        * Returns None when the lookup does not apply
+        """
+        from osgeo import gdal_array
+        if kwargs or not resampleAlg in (None, 'near', 'mode'):
+            return None
+
+        ds = gdal.Open(source) if isinstance(source, str) else source
+        if not isinstance(ds, gdal.Dataset) or ds.RasterCount != 1:
+            return None
+        band = ds.GetRasterBand(1)
+        dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType))
+        if not dtype.kind in "ui" or dtype.itemsize > 2:
+            return None
+
+        noData = band.GetNoDataValue()
+        if not noData is None and not np.iinfo(dtype).min <= noData <= np.iinfo(dtype).max:
+            noData = None
+        table = compileValueLookup(value, dtype, noData=noData, trueValue=np.uint8(100))
+        unsigned = np.dtype("u%d" % dtype.itemsize)
+
+        # Pixels outside of the source are given a value which is not indicated
+        unselected = np.flatnonzero(table == 0)
+        if noData is None and len(unselected) == 0:
+            return None
+        fill = noData if not noData is None else np.array(unselected[0], dtype=unsigned).view(dtype)
+
+        xO, dx, _, yO, _, dy = ds.GetGeoTransform()
+        srs = gk.srs.loadSRS(ds.GetProjectionRef())
+        if gridAligned(s.region, srs, xO, yO, dx, -dy):
+            xOff, yOff, xN, yN = windowOffsets(s.region.extent, xO, yO, dx, -dy)
+            data = readWindow(ds, xOff, yOff, xN, yN, fill=fill)
+        elif resampleAlg == 'near':
+            warped = gdal.Warp("", ds, format="MEM", dstSRS=s.srs.ExportToWkt(), 
+                               outputBounds=s.region.extent.xyXY, xRes=s.region.pixelWidth, 
+                               yRes=s.region.pixelHeight, resampleAlg="near", 
+                               srcNodata=noData, dstNodata=float(fill))
+            data = warped.GetRasterBand(1).ReadAsArray().astype(dtype, copy=False)
         else:
-            raise GlaesError("mode must be 'exclude' or 'include'")
+            return None
+
+        return table.take(data.view(unsigned))
+
+    def _indicateSupersampled(s, indicate, resolutionDiv, buffer=None, blockRows=None, workers=1, adaptive=False, threadSafe=True):
+        """Evaluates an indication function, which takes a RegionMask and a 
+        resolution divisor, over the calculator's region
+
+        * With 'adaptive', only boundary pixels are supersampled (see 
+          glaes.core.util.indicateAdaptive)
+        * With 'blockRows', the region is supersampled in blocks of rows (see
+          glaes.core.util.indicateInBlocks)
+        * Otherwise, the whole region is supersampled at once
+        """
+        halo = 0 if buffer is None else buffer
+        if resolutionDiv > 1 and adaptive:
+            return indicateAdaptive(s.region, indicate, resolutionDiv, halo=halo)
+        if resolutionDiv > 1 and not blockRows is None:
+            return indicateInBlocks(s.region, indicate, resolutionDiv=resolutionDiv, halo=halo,
+                                    blockRows=None if blockRows == 'auto' else blockRows,
+                                    workers=workers if threadSafe else 1)
+        return indicate(s.region)
+
+    def _indicateFeatureBuffers(s, source, where, buffer, bufferField, resolutionDiv=1):
+        """Indicates (0-100) the pixels within a feature-dependent buffer 
+        distance of a vector source's features
+
+        * Features are rasterized once, labelled with their buffer distance
+        * Each distinct distance is applied with a Euclidean distance transform
+          of the pixels carrying it
+        """
+        from osgeo import ogr
+        from scipy.ndimage import distance_transform_edt
+
+        if isinstance(buffer, dict) and bufferField is None:
+            raise GlaesError("'bufferField' is required when 'buffer' is a dict")
+
+        # Find each feature's distance
+        bufferAttribute = buffer if isinstance(buffer, str) else bufferField
+        if isinstance(buffer, dict):
+            maxDist = max(buffer.values(), default=0)
+        else:
+            attributes = gk.vector.extractFeatures(source, where=where, onlyAttr=True)
+            if attributes.shape[0] == 0:
+                return np.zeros(s.region.mask.shape, dtype=np.uint8)
+            maxDist = np.nanmax(attributes[bufferAttribute].values.astype(np.float64))
+
+        searchExtent = s.region.extent.pad(max(maxDist, 0))
+        features = gk.vector.extractFeatures(source, where=where, geom=searchExtent.box, srs=s.srs)
+        if features.shape[0] == 0:
+            return np.zeros(s.region.mask.shape, dtype=np.uint8)
+
+        if isinstance(buffer, dict):
+            distances = features[bufferAttribute].map(buffer).values.astype(np.float64)
+        else:
+            distances = features[bufferAttribute].values.astype(np.float64)
+
+        keep = ~np.isnan(distances)
+        geoms = features.geom.values[keep]
+        distances = distances[keep]
+
+        if len(geoms) == 0:
+            return np.zeros(s.region.mask.shape, dtype=np.uint8)
+        maxDist = max(distances.max(), 0)
+
+        # Rasterize all features on a (padded) fine grid with their distances
+        #  * Features are burned in order of increasing distance, so that the 
+        #    largest distance wins where features overlap
+        pw = s.region.pixelWidth / resolutionDiv
+        ph = s.region.pixelHeight / resolutionDiv
+        padX = int(np.ceil(maxDist / pw))
+        padY = int(np.ceil(maxDist / ph))
+        rows, cols = s.region.mask.shape
+        rows, cols = rows * resolutionDiv + 2 * padY, cols * resolutionDiv + 2 * padX
+
+        vec = ogr.GetDriverByName("Memory").CreateDataSource("")
+        layer = vec.CreateLayer("", s.srs, ogr.wkbUnknown)
+        layer.CreateField(ogr.FieldDefn("distance", ogr.OFTReal))
+        for i in np.argsort(distances, kind="stable"):
+            feature = ogr.Feature(layer.GetLayerDefn())
+            feature.SetGeometry(geoms[i])
+            feature.SetField("distance", float(distances[i]))
+            layer.CreateFeature(feature)
+
+        ds = gdal.GetDriverByName("MEM").Create("", cols, rows, 1, gdal.GDT_Float64)
+        ds.SetGeoTransform((s.region.extent.xMin - padX * pw, pw, 0,
+                            s.region.extent.yMax + padY * ph, 0, -ph))
+        ds.SetProjection(s.srs.ExportToWkt())
+        ds.GetRasterBand(1).Fill(np.nan)
+        gdal.RasterizeLayer(ds, [1], layer, options=["ATTRIBUTE=distance"])
+        labels = ds.ReadAsArray()
+
+        # Apply each distance through a distance transform of its pixels
+        indicated = np.zeros(labels.shape, dtype=bool)
+        for distance in np.unique(labels[~np.isnan(labels)]):
+            labelled = labels == distance
+            if distance <= 0:
+                indicated |= labelled
+            else:
+                indicated |= distance_transform_edt(~labelled, sampling=(ph, pw)) <= distance
+
+        # Crop the padding, and scale back to the RegionMask's resolution
+        indicated = indicated[padY:rows - padY, padX:cols - padX]
+        if resolutionDiv > 1:
+            indicated = gk.util.scaleMatrix(indicated.astype(np.float64), -resolutionDiv)
+
+        return np.round(indicated * 100).astype(np.uint8)
 
     def excludePrior(s, prior, value=None, buffer=None, invert=False, mode="exclude", **kwargs):
         """Exclude areas based off the values in one of the Prior data sources
@@ -746,6 +1161,10 @@ class ExclusionCalculator(object):
           around the ExclusionCalculator's region, after which a call to
           ExclusionCalculator.excludeRasterType is made, therefore all the same
           inputs apply here as well
+        * If the Prior has a pyramid level (see PriorSource.buildPyramid) which 
+          matches the ExclusionCalculator's grid, the level's pre-aggregated 
+          percentages are used instead, which is much faster for coarse 
+          screening analyses
 
         Parameters:
         -----------
@@ -762,6 +1181,11 @@ class ExclusionCalculator(object):
               range of values to exclude
                 * If either boundary is given as None, then it is interpreted as
                   unlimited
+            * Either boundary can also be a matrix matching the RegionMask's 
+              shape, or a raster datasource, of per-pixel thresholds (see 
+              ExclusionCalculator.thresholdRaster)
+                * A NaN boundary means that the pixel's availability is left
+                  unchanged (also when 'invert' is True)
 
         buffer : float; optional
             A buffer region to add around the indicated pixels
@@ -793,6 +1217,133 @@ class ExclusionCalculator(object):
             raise GlaesError(
                 "'prior' input must be a Prior object or an associated string")
 
+        # Per-pixel thresholds are compared against the Prior's indices directly
+        if s._isSpatialValue(value):
+            value = s._spatialValue(value)
+            unchanged = s._undefinedThresholds(value)
+            value = tuple(None if v is None else prior.valueToIndex(v) for v in value)
+            s._applyAreas(s._indicateIndices(s._priorIndexMatrix(prior), value, prior.rawNoData), 
+                          invert=invert, mode=mode, unchanged=unchanged)
+            return
+
+        value = s._priorIndexValue(prior, value)
+
+        # When the Prior is contained in a loaded region pack, use it directly
+        if not kwargs:
+            indices = s._packedIndices(prior)
+            if indices is not None:
+                s._applyAreas(s._indicateIndices(indices, value, prior.rawNoData), invert=invert, mode=mode)
+                return
+
+        # When a pyramid level matches the region's grid, use the pre-aggregated
+        # percentages directly
+        pyramid = None if kwargs else prior.pyramidLevel(s.region)
+        if pyramid is not None:
+            low, high = s._indexBounds(value)
+            areas = np.round(prior.extractFraction(s.region.extent, pyramid, low, high)).astype(np.uint8)
+            s._applyAreas(areas, invert=invert, mode=mode)
+            return
+
+        # When the region lies on the prior's own grid, the indices can be 
+        # compared directly (served from memory when the prior is a flat store)
+        if not kwargs and gridAligned(s.region, prior.srs, prior.xMin, prior.yMax, prior.dx, prior.dy):
+            areas = s._indicateIndices(prior.extractWindow(s.region.extent), value, prior.rawNoData)
+            s._applyAreas(areas, invert=invert, mode=mode)
+            return
+
+        # When an index map has been built, the indices are gathered directly
+        if not kwargs and s._usePriorIndexMap(prior):
+            indices = s._mapPriorIndices(prior)
+            low, high = s._indexBounds(value)
+            indicated = (indices >= low) & (indices <= high) & (indices != prior.rawNoData)
+            areas = np.round(indicated.mean(axis=0) * 100).astype(np.uint8)
+            s._applyAreas(areas, invert=invert, mode=mode)
+            return
+
+        # source = prior.generateRaster( s.region.extent,)
+
+        source = prior.sourceFor(s.region.extent.castTo(prior.srs))
+        if prior.band != 1:  # The prior lives in a PriorCube
+            source = gdal.Translate("", source, format="VRT", bandList=[prior.band])
+
+        # Call the excluder
+        s.excludeRasterType(source, value=value,
+                            invert=invert, mode=mode, **kwargs)
+
+    def thresholdRaster(s, source, attribute, where=None, default=np.nan):
+        """Creates a matrix of per-pixel thresholds by rasterizing the features 
+        of a vector source with one of their attributes, which can be used as a 
+        boundary in 'excludePrior' and 'excludeRasterType'
+
+        * For example, the settlement setback of each German state could be 
+          applied in a single call with:
+            >>> thresholds = ec.thresholdRaster(states, "SETBACK")
+            >>> ec.excludePrior("settlement_proximity", value=(None, thresholds))
+        * Pixels are assigned to the feature covering their center
+        
+        Parameters:
+        -----------
+        source : str
+            The vector source containing the features
+
+        attribute : str
+            The numeric attribute holding each feature's threshold
+
+        where : str; optional
+            A filtering statement to apply to the source's features
+
+        default : numeric; optional
+            The threshold to give pixels which are not covered by any feature
+            * NaN means that exclusions leave these pixels unchanged
+
+        Returns:
+        --------
+        numpy.ndarray with the RegionMask's shape
+
+        """
+        rows, cols = s.region.mask.shape
+        ds = gdal.GetDriverByName("MEM").Create("", cols, rows, 1, gdal.GDT_Float64)
+        ds.SetGeoTransform((s.region.extent.xMin, s.region.pixelWidth, 0,
+                            s.region.extent.yMax, 0, -s.region.pixelHeight))
+        ds.SetProjection(s.srs.ExportToWkt())
+        ds.GetRasterBand(1).Fill(default)
+
+        gdal.Rasterize(ds, source, attribute=attribute, where=where)
+
+        return ds.ReadAsArray()
+
+    def _isSpatialValue(s, value):
+        """Checks if a value range contains per-pixel thresholds"""
+        if not isinstance(value, tuple):
+            return False
+        return any(isinstance(v, (np.ndarray, str, gdal.Dataset)) for v in value)
+
+    def _spatialValue(s, value):
+        """Turns the boundaries of a value range into matrices on the 
+        RegionMask's grid (or leaves them as they are, if they are numeric)"""
+        output = []
+        for v in value:
+            if isinstance(v, (str, gdal.Dataset)):
+                v = s.region.warp(v, resampleAlg="near", applyMask=False)
+            if isinstance(v, np.ndarray):
+                if v.shape != s.region.mask.shape:
+                    raise GlaesError("Threshold matrices must match the shape of the RegionMask")
+                v = v.astype(np.float64)
+            output.append(v)
+        return tuple(output)
+
+    def _undefinedThresholds(s, value):
+        """Flags the pixels at which any per-pixel threshold of a value range 
+        is NaN (or None, if no thresholds are matrices)"""
+        undefined = None
+        for v in value:
+            if isinstance(v, np.ndarray):
+                undefined = np.isnan(v) if undefined is None else undefined | np.isnan(v)
+        return undefined
+
+    def _priorIndexValue(s, prior, value):
+        """Checks a value (or value range) given for a Prior, and projects it 
+        into the Prior's raw 'index space'"""
         # try to get the default value if one isn't given
         if value is None:
             try:
@@ -802,7 +1353,9 @@ class ExclusionCalculator(object):
                     "Could not find a default exclusion set for %s" % prior.displayName)
 
         # Check the value input
-        if isinstance(value, tuple):
+        if prior.isDistance:
+            pass  # Any value is exact
+        elif isinstance(value, tuple):
 
             # Check the boundaries
             if not value[0] is None:
@@ -824,22 +1377,455 @@ class ExclusionCalculator(object):
         try:
             v1, v2 = value
             if not v1 is None:
-                v1 = np.interp(v1, prior._values_wide,
-                               np.arange(prior._values_wide.size))
+                v1 = prior.valueToIndex(v1)
             if not v2 is None:
-                v2 = np.interp(v2, prior._values_wide,
-                               np.arange(prior._values_wide.size))
+                v2 = prior.valueToIndex(v2)
 
             value = (v1, v2)
         except TypeError:
             if not value == 0:
-                value = np.interp(value, prior._values_wide,
-                                  np.arange(prior._values_wide.size))
-        # source = prior.generateRaster( s.region.extent,)
+                value = prior.valueToIndex(value)
 
-        # Call the excluder
-        s.excludeRasterType(prior.path, value=value,
-                            invert=invert, mode=mode, **kwargs)
+        return value
+
+    @staticmethod
+    def _indexBounds(value):
+        """Turns an index-space value (or value range) into inclusive lower and 
+        upper bounds"""
+        try:
+            v1, v2 = value
+        except TypeError:
+            v1, v2 = value, value
+
+        return (-np.inf if v1 is None else v1), (np.inf if v2 is None else v2)
+
+    def _indicateIndices(s, indices, value, noData=None):
+        """Indicates (0-100) the raw Prior indices which fall within an 
+        index-space value (or value range)
+
+        * Indices equal to 'noData' are never indicated
+        """
+        low, high = s._indexBounds(value)
+        with np.errstate(invalid="ignore"):
+            indicated = (indices >= low) & (indices <= high)
+        if not noData is None:
+            indicated &= indices != noData
+        return indicated.astype(np.uint8) * 100
+
+    def _priorIndexMatrix(s, prior):
+        """Reads the raw Prior indices on the ExclusionCalculator's grid
+        * Indices from a loaded region pack are used when available
+        * When the grids match, the Prior's window is read directly
+        * Otherwise the indices are warped with nearest-neighbor resampling
+        """
+        indices = s._packedIndices(prior)
+        if indices is not None:
+            return indices
+
+        if s._usePriorIndexMap(prior) and not gridAligned(s.region, prior.srs, prior.xMin, prior.yMax, prior.dx, prior.dy):
+            return s._mapPriorIndices(prior, center=True)
+
+        return prior.extractRegion(s.region)
+
+    def buildPriorIndexMap(s, supersample=1, srs=None):
+        """Builds a map from the ExclusionCalculator's pixels to the coordinates
+        of the Prior datasets, so that Priors can be sampled onto the region's
+        grid without warping
+
+        * All Priors share one grid, so the coordinate transformation only needs
+          to be done once per ExclusionCalculator
+        * Once built, ExclusionCalculator.excludePrior (without additional 
+          keyword arguments) gathers each Prior's indices through the map 
+          whenever the region's grid differs from the Prior's
+        * Memory use scales with the number of region pixels times the 
+          square of 'supersample'
+
+        Parameters:
+        -----------
+        supersample : int; optional
+            The number of sample points along each axis within each pixel
+            * With a value above 1, excluded pixels receive fractional 
+              indications according to the share of their sample points which
+              are excluded
+
+        srs : Anything acceptable to geokit.srs.loadSRS(); optional
+            The srs of the Priors
+            * By default, EPSG3035 is used
+
+        Returns:
+        --------
+        IndexMap : namedtuple
+            - IndexMap.srs : The srs of the mapped coordinates
+            - IndexMap.x, IndexMap.y : The mapped coordinates with the shape
+              (supersample**2, rows, columns)
+            - IndexMap.cx, IndexMap.cy : The mapped pixel centers with the 
+              shape (rows, columns)
+        """
+        srs = gk.srs.EPSG3035 if srs is None else gk.srs.loadSRS(srs)
+        supersample = int(supersample)
+        if supersample < 1:
+            raise GlaesError("supersample must be a positive integer")
+
+        rows, cols = s.region.mask.shape
+
+        # Make sample points inside each pixel
+        #  * With an even 'supersample', no sample lies at the pixel center, so
+        #    the centers are added as extra points
+        offsets = (np.arange(supersample) + 0.5) / supersample
+        ox, oy = np.meshgrid(offsets, offsets)
+        ox, oy = ox.ravel(), oy.ravel()
+        if supersample % 2 == 0:
+            ox, oy = np.append(ox, 0.5), np.append(oy, 0.5)
+        x = s.region.extent.xMin + (np.arange(cols).reshape(1, 1, -1) + ox.reshape(-1, 1, 1)) * s.region.pixelWidth
+        y = s.region.extent.yMax - (np.arange(rows).reshape(1, -1, 1) + oy.reshape(-1, 1, 1)) * s.region.pixelHeight
+        x, y = np.broadcast_arrays(x, y)
+
+        # Transform once
+        if not srs.IsSame(s.srs):
+            xy = np.column_stack([x.ravel(), y.ravel()])
+            xy = np.array(gk.srs.xyTransform(xy, fromSRS=s.srs, toSRS=srs, outputFormat="raw"))[:, :2]
+            x = xy[:, 0].reshape(x.shape)
+            y = xy[:, 1].reshape(y.shape)
+        else:
+            x = np.array(x)
+            y = np.array(y)
+
+        # Separate the pixel centers
+        n = supersample**2
+        center = n if supersample % 2 == 0 else n // 2
+        s._priorIndexMap = IndexMap(srs, x[:n], y[:n], x[center], y[center])
+        return s._priorIndexMap
+
+    def _usePriorIndexMap(s, prior):
+        """Checks if the Prior index map can be used for the given Prior"""
+        return s._priorIndexMap is not None and prior.srs.IsSame(s._priorIndexMap.srs)
+
+    def _mapPriorIndices(s, prior, center=False):
+        """Gathers the raw Prior indices at each sample point of the index map
+
+        * If 'center' is True, only the pixel centers are sampled
+
+        Returns:
+        --------
+        numpy.ndarray with the shape (samples, rows, columns), or (rows, 
+        columns) when 'center' is True
+        """
+        m = s._priorIndexMap
+        x, y = (m.cx, m.cy) if center else (m.x, m.y)
+        cols = np.floor((x - prior.xMin) / prior.dx).astype(np.int64)
+        rows = np.floor((prior.yMax - y) / prior.dy).astype(np.int64)
+
+        # Read the smallest window containing all samples
+        c0, c1 = cols.min(), cols.max() + 1
+        r0, r1 = rows.min(), rows.max() + 1
+        extent = gk.Extent(prior.xMin + c0 * prior.dx, prior.yMax - r1 * prior.dy,
+                           prior.xMin + c1 * prior.dx, prior.yMax - r0 * prior.dy, srs=prior.srs)
+        window = prior.extractWindow(extent)
+
+        return window[rows - r0, cols - c0]
+
+    def buildRegionPack(s, path, priors):
+        """Stores the raw indices of several Priors, sampled onto the 
+        ExclusionCalculator's grid, in a single compressed local file
+
+        * The pack is independent of any threshold, so later 
+          ExclusionCalculator instances on the same region (see the 
+          'regionPack' initialization argument) can serve 'excludePrior' 
+          from it without opening or warping the original Prior datasets
+        * Indices are sampled as in ExclusionCalculator.thresholdCurve
+        * The pack is written with numpy.savez_compressed
+
+        Parameters:
+        -----------
+        path : str
+            The path of the pack file to create
+            * Should end with '.npz'
+
+        priors : list
+            The Priors (or their names) to include
+
+        Returns:
+        --------
+        str : The path of the pack file
+
+        """
+        header = OrderedDict()
+        header["srs"] = s.srs.ExportToWkt()
+        header["extent"] = list(s.region.extent.xyXY)
+        header["pixelWidth"] = s.region.pixelWidth
+        header["pixelHeight"] = s.region.pixelHeight
+        header["shape"] = list(s.region.mask.shape)
+        header["priors"] = []
+
+        arrays = OrderedDict()
+        for i, prior in enumerate(priors):
+            if isinstance(prior, str):
+                prior = Priors[prior]
+            if not isinstance(prior, PriorSource):
+                raise GlaesError(
+                    "'priors' must contain Prior objects or associated strings")
+
+            arrays["prior_%d" % i] = np.asarray(s._priorIndexMatrix(prior))
+            header["priors"].append(OrderedDict([("name", prior.displayName),
+                                                 ("array", "prior_%d" % i),
+                                                 ("meta", dict(prior.meta))]))
+
+        with open(path, "wb") as fo:
+            np.savez_compressed(fo, header=np.array(json.dumps(header)), **arrays)
+
+        return path
+
+    def loadRegionPack(s, path):
+        """Loads a region pack (see ExclusionCalculator.buildRegionPack) so that
+        Prior exclusions are served from it
+
+        * The pack must have been built for the same region and grid
+        """
+        data = np.load(path, allow_pickle=False)
+        header = json.loads(str(data["header"]))
+
+        # Make sure the pack fits the region
+        srs = gk.srs.loadSRS(header["srs"])
+        if not (srs.IsSame(s.srs) and
+                tuple(header["shape"]) == s.region.mask.shape and
+                np.isclose(header["extent"], s.region.extent.xyXY).all() and
+                np.isclose(header["pixelWidth"], s.region.pixelWidth) and
+                np.isclose(header["pixelHeight"], s.region.pixelHeight)):
+            raise GlaesError("The region pack '%s' does not match the ExclusionCalculator's region" % path)
+
+        s._regionPack = OrderedDict()
+        for entry in header["priors"]:
+            s._regionPack[entry["name"]] = (entry["meta"], data[entry["array"]])
+
+    def _packedIndices(s, prior):
+        """Returns the Prior's indices from the loaded region pack, or None"""
+        if s._regionPack is None or prior.displayName not in s._regionPack:
+            return None
+
+        meta, indices = s._regionPack[prior.displayName]
+        # The pack is only valid for the same version of the Prior
+        for key in ["VALUE_MAP", "PRIOR_FORMAT", "SCALE"]:
+            if meta.get(key) != prior.meta.get(key):
+                warn("The region pack entry for %s does not match the Prior, and is ignored" % prior.displayName, UserWarning)
+                return None
+
+        return indices
+
+    def thresholdCurve(s, prior, values, above=False):
+        """Computes the availability which would remain after excluding a Prior
+        at each of several threshold values
+
+        * The Prior is read once, and the whole curve is built from a single
+          histogram of the Prior's indices weighted by the current availability
+        * The current availability is not changed
+        * When the ExclusionCalculator's grid matches the Prior's, each point of
+          the curve is identical to the result of calling
+          ExclusionCalculator.excludePrior with the value range (None, value)
+          - Otherwise the Prior is sampled with nearest-neighbor resampling,
+            so small deviations from 'excludePrior' are expected
+
+        Parameters:
+        -----------
+        prior : str or PriorSource
+            The Prior (or the name of one) to evaluate
+
+        values : iterable
+            The threshold values to evaluate
+            * Each value is treated as the upper boundary of the excluded
+              range, i.e. (None, value), as is typical for setback distances
+
+        above : bool; optional
+            If True, each value is instead treated as the lower boundary of the
+            excluded range, i.e. (value, None)
+
+        Returns:
+        --------
+        pandas.DataFrame
+            * Indexed by the threshold values
+            * Columns are 'percentAvailable' and 'areaAvailable', following the
+              ExclusionCalculator's properties of the same names
+        """
+        if isinstance(prior, str):
+            prior = Priors[prior]
+
+        if not isinstance(prior, PriorSource):
+            raise GlaesError(
+                "'prior' input must be a Prior object or an associated string")
+
+        # Histogram of the current availability over the prior's indices
+        indices = s._priorIndexMatrix(prior)[s.region.mask]
+        weights = s._availability[s.region.mask].astype(np.float64)
+        hist = np.bincount(indices.ravel(), weights=weights, minlength=prior.rawNoData+1)
+        cumulative = np.concatenate([[0], np.cumsum(hist)])
+        total = cumulative[-1]
+
+        # Evaluate each threshold
+        values = list(values)
+        available = []
+        for value in values:
+            rng = (value, None) if above else (None, value)
+            low, high = s._indexBounds(s._priorIndexValue(prior, rng))
+
+            # Indices which satisfy low <= i <= high are excluded (no-data 
+            # indices never are)
+            highI = int(np.clip(np.floor(high), -1, prior.rawNoData-1))
+            lowI = int(np.clip(np.ceil(low), 0, prior.rawNoData+1))
+            excluded = max(cumulative[highI+1] - cumulative[lowI], 0)
+
+            available.append(total - excluded)
+
+        available = np.array(available)
+        result = pd.DataFrame(index=pd.Index(values, name="value"))
+        result["percentAvailable"] = available / s.region.mask.sum()
+        result["areaAvailable"] = available * s.region.pixelWidth * s.region.pixelHeight / 100
+
+        return result
+
+    def computeSlack(s, priors, output=None):
+        """Computes the 'slack' of each pixel in the region with respect to 
+        several Priors, so that any combination of thresholds for these Priors 
+        can later be evaluated without any raster I/O
+
+        * The slack of a pixel with respect to a Prior is the Prior's raw edge
+          index at the pixel, which is the largest threshold (as an edge index)
+          for which the pixel survives a setback exclusion
+        * The current availability is stored alongside the slack, so that the
+          result of all exclusions applied so far is retained
+        * The slack is stored as a compact multi-band uint8 raster on the 
+          ExclusionCalculator's grid
+        * Distance Priors are not supported
+
+        Parameters:
+        -----------
+        priors : list
+            The Priors (or their names) to include
+
+        output : str; optional
+            A path to write the slack raster to
+            * If not given, the raster is kept in memory
+
+        Returns:
+        --------
+        PriorSlack
+
+        """
+        from uuid import uuid4
+
+        sources = []
+        for prior in priors:
+            if isinstance(prior, str):
+                prior = Priors[prior]
+            if not isinstance(prior, PriorSource):
+                raise GlaesError(
+                    "'priors' must contain Prior objects or associated strings")
+            if prior.isDistance:
+                raise GlaesError("%s: distance Priors cannot be stored in a slack raster" % prior.displayName)
+            sources.append(prior)
+
+        if output is None:
+            output = "/vsimem/glaes_slack_%s.tif" % uuid4().hex
+
+        rows, cols = s.region.mask.shape
+        ds = gdal.GetDriverByName("GTiff").Create(output, cols, rows, len(sources) + 1, gdal.GDT_Byte,
+                                                  ["TILED=YES", "COMPRESS=LZW", "BIGTIFF=IF_SAFER"])
+        ds.SetGeoTransform((s.region.extent.xMin, s.region.pixelWidth, 0,
+                            s.region.extent.yMax, 0, -s.region.pixelHeight))
+        ds.SetProjection(s.srs.ExportToWkt())
+        ds.SetMetadataItem("GLAES_PRIOR_SLACK", "YES")
+        ds.SetMetadataItem("REGION_PIXELS", str(int(s.region.mask.sum())))
+
+        for i, prior in enumerate(sources):
+            indices = np.array(s._priorIndexMatrix(prior), dtype=np.uint8)
+            indices[~s.region.mask] = 255
+
+            band = ds.GetRasterBand(i + 1)
+            band.WriteArray(indices)
+            band.SetNoDataValue(255)
+            band.SetDescription(prior.displayName)
+            meta = dict(prior.meta)
+            meta["DISPLAY_NAME"] = prior.displayName
+            band.SetMetadata(meta)
+
+        band = ds.GetRasterBand(len(sources) + 1)
+        band.WriteArray(s._availability.astype(np.uint8))
+        band.SetDescription("availability")
+
+        ds.FlushCache()
+        del ds
+
+        return PriorSlack(output)
+
+    def excludePriorCube(s, cube, exclusions=None, invert=False, mode="exclude"):
+        """Exclude areas based off several Priors stored in a PriorCube at once
+
+        * A single window of the cube is read (or warped, when the 
+          ExclusionCalculator's grid differs from the cube's) and every Prior's
+          threshold is applied in one vectorized pass over the bands
+        * When the grids match, the result is identical to calling 
+          'excludePrior' for each Prior with the same value
+        * Buffering is not supported
+
+        Parameters:
+        -----------
+        cube : str or PriorCube
+            The PriorCube (or a path to one) to exclude from
+
+        exclusions : dict or list; optional
+            The Priors and values to exclude
+            * If a dict, keys are Prior names and values follow the conventions
+              of ExclusionCalculator.excludePrior
+            * If a list of Prior names, the typical exclusion value is used for 
+              each
+            * If None, all Priors in the cube are excluded by their typical 
+              exclusion values
+
+        invert: bool; optional
+            If True, flip indications
+
+        mode: string; optional
+            * If 'exclude', then the indicated pixels are subtracted from the
+              current availability matrix
+            * If 'include', then the indicated pixel are added back into the
+              availability matrix
+        """
+        if isinstance(cube, str):
+            cube = PriorCube(cube)
+
+        if exclusions is None:
+            exclusions = cube.names
+        if not isinstance(exclusions, dict):
+            exclusions = dict((name, None) for name in exclusions)
+
+        names = list(exclusions.keys())
+
+        # Get index-space bounds for each prior
+        lows = []
+        highs = []
+        for name in names:
+            low, high = s._indexBounds(s._priorIndexValue(cube[name], exclusions[name]))
+            lows.append(low)
+            highs.append(high)
+
+        lows = np.array(lows).reshape(-1, 1, 1)
+        highs = np.array(highs).reshape(-1, 1, 1)
+
+        # Read the cube around the region
+        if gridAligned(s.region, cube.srs, cube.xMin, cube.yMax, cube.dx, cube.dy):
+            data = cube.extractWindow(s.region.extent, names)
+        else:
+            bands = [cube[name].band for name in names]
+            subset = gdal.Translate("", cube.path, format="VRT", bandList=bands)
+            warped = gdal.Warp("", subset, format="MEM", dstSRS=s.srs.ExportToWkt(), 
+                               outputBounds=s.region.extent.xyXY, xRes=s.region.pixelWidth, 
+                               yRes=s.region.pixelHeight, resampleAlg="near", 
+                               srcNodata=255, dstNodata=255)
+            data = warped.ReadAsArray().reshape(len(names), *s.region.mask.shape)
+
+        # Indicate all priors in one pass
+        indicated = ((data >= lows) & (data <= highs) & (data != 255)).any(axis=0)
+        areas = indicated.astype(np.uint8) * 100
+
+        s._applyAreas(areas, invert=invert, mode=mode)
 
     def excludeRegionEdge(s, buffer):
         """Exclude some distance from the region's edge
@@ -1029,11 +2015,15 @@ class ExclusionCalculator(object):
         if verbose:
             print("Done!")
 
-    def shrinkAvailability(s, dist, threshold=50):
-        """Shrinks the current availability by a given distance in the given SRS"""
+    def shrinkAvailability(s, dist, threshold=50, workers=1):
+        """Shrinks the current availability by a given distance in the given SRS
+
+        * 'workers' threads are used to buffer the geometries, when shapely is
+          available
+        """
         geom = gk.geom.polygonizeMask(
             s._availability >= threshold, bounds=s.region.extent.xyXY, srs=s.region.srs, flat=False)
-        geom = [g.Buffer(-dist) for g in geom]
+        geom = [g for g in geometry.buffer(geom, -dist, workers=workers) if not g is None and not g.IsEmpty()]
         newAvail = (s.region.indicateGeoms(geom) * 100).astype(np.uint8)
         s._availability = newAvail
 
@@ -1045,7 +2035,7 @@ class ExclusionCalculator(object):
         # Create a vector file of geometries larger than 'minSize'
         geoms = gk.geom.polygonizeMask(
             s._availability >= threshold, bounds=s.region.extent.xyXY, srs=s.region.srs, flat=False)
-        geoms = list(filter(lambda x: x.Area() >= minSize, geoms))
+        geoms = [g for g, a in zip(geoms, geometry.area(geoms)) if a >= minSize]
         vec = gk.core.util.quickVector(geoms)
 
         # Replace current availability matrix
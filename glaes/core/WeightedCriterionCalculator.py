@@ -155,6 +155,8 @@ class WeightedCriterionCalculator(object):
 
         * if not 'value' input is given, the default buffer/threshold value is chosen (see the individual function's 
           docstring for more information)
+        * Further keyword arguments are passed on to the RegionMask's warp function
+        * Pixels without any Prior data contribute no score
         """
         if isinstance(source, str): source = Priors[source]
         if isinstance(source, PriorSource):
@@ -162,18 +164,12 @@ class WeightedCriterionCalculator(object):
             
             if vs is None:
                 vs = s.typicalValueScores[source.displayName]
-                
-            source = source.generateRaster( s.region.extent)
 
-            skipClip=True # we dont need to clip again
-
-        else: 
-            skipClip=False # we will likely still need to clip
-            if name is None: 
-                if isinstance(source, str):
-                    name=basename(source)
-                else:
-                    raise GlaesError("A 'name' input must be provided when source is not a prior or a path")
+        elif name is None: 
+            if isinstance(source, str):
+                name=basename(source)
+            else:
+                raise GlaesError("A 'name' input must be provided when source is not a prior or a path")
 
         # make sure known inputs are okay
         knownValues = [x[0] for x in vs]
@@ -183,14 +179,28 @@ class WeightedCriterionCalculator(object):
             knownValues = knownValues[::-1]
             knownScores = knownScores[::-1]
 
-        # make a mutator
-        def mutator(data):
-            return np.interp(data, knownValues, knownScores)
+        if isinstance(source, PriorSource):
+            # compose the prior's index-to-value lookup with the value-score 
+            # mapping, so that both are applied lazily while warping
+            lookup = source.valueLookup(knots=knownValues)
+            lookup = OrderedDict((k, np.interp(v, knownValues, knownScores)) for k, v in lookup.items())
+
+            # mark the prior's no-data with a value which no score can take, so
+            # that it is left out of the resampling
+            noData = min(knownScores) - 1
+            mutDS = source.lookupRaster(s.region.extent, lookup, noData=noData, pad=2)
+            result = s.region.warp(mutDS, resampleAlg=resampleAlg, noData=noData, **kwargs)
+            result[result == noData] = 0
 
-        # mclip,mutate,andwarp the datasource
-        clippedDS = source if skipClip else s.region.extent.clipRaster(source)
-        mutDS = gk.raster.mutateValues( clippedDS, processor=mutator)
-        result = s.region.warp(mutDS, resampleAlg=resampleAlg)
+        else: 
+            # make a mutator
+            def mutator(data):
+                return np.interp(data, knownValues, knownScores)
+
+            # clip and mutate the datasource
+            clippedDS = s.region.extent.clipRaster(source)
+            mutDS = gk.raster.mutateValues( clippedDS, processor=mutator)
+            result = s.region.warp(mutDS, resampleAlg=resampleAlg, **kwargs)
 
         newWeights = weight*result
         s._totalWeight += weight
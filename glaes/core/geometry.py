@@ -0,0 +1,213 @@
+"""Vectorized geometry operations for lists of OGR geometries
+
+* When shapely (>=2.0) is installed, operations are applied to whole arrays
+  of geometries at once with shapely's GEOS ufuncs, optionally spread over
+  several threads (GEOS releases the GIL)
+* Otherwise, each geometry is processed with OGR
+* Inputs and outputs are always lists of ogr.Geometry objects, so that the
+  results can be passed on to geokit directly
+"""
+from .util import *
+
+_SHAPELY = None
+
+
+def _shapely():
+    """Returns the shapely module if shapely>=2.0 is available, else None"""
+    global _SHAPELY
+    if _SHAPELY is None:
+        try:
+            import shapely
+            _SHAPELY = shapely if int(shapely.__version__.split(".")[0]) >= 2 else False
+        except ImportError:
+            _SHAPELY = False
+    return _SHAPELY if _SHAPELY else None
+
+
+def hasShapely():
+    """Checks if the vectorized shapely backend is available"""
+    return _shapely() is not None
+
+
+def toShapely(geoms):
+    """Converts a list of ogr.Geometry objects to an array of shapely geometries"""
+    shapely = _shapely()
+    return shapely.from_wkb([g.ExportToWkb() for g in geoms])
+
+
+def toOgr(geoms, srs=None):
+    """Converts an array of shapely geometries to a list of ogr.Geometry objects
+
+    * Missing geometries are given as None
+    """
+    from osgeo import ogr
+    shapely = _shapely()
+
+    output = []
+    for wkb in shapely.to_wkb(geoms):
+        if wkb is None:
+            output.append(None)
+            continue
+        g = ogr.CreateGeometryFromWkb(bytes(wkb))
+        if not srs is None: g.AssignSpatialReference(srs)
+        output.append(g)
+    return output
+
+
+def _srsOf(geoms):
+    """Finds the srs of the first geometry which has one"""
+    for g in geoms:
+        if not g is None and not g.GetSpatialReference() is None:
+            return g.GetSpatialReference()
+    return None
+
+
+def _apply(func, arrays, workers=1):
+    """Applies a shapely ufunc over equally long arrays, splitting them into
+    chunks handled by several threads when 'workers' > 1"""
+    n = len(arrays[0])
+    if workers <= 1 or n < 2 * workers:
+        return func(*arrays)
+
+    from concurrent.futures import ThreadPoolExecutor
+    bounds = np.linspace(0, n, workers + 1).astype(int)
+    with ThreadPoolExecutor(workers) as pool:
+        parts = pool.map(lambda i: func(*[a[bounds[i]:bounds[i + 1]] for a in arrays]), range(workers))
+        return np.concatenate(list(parts))
+
+
+def buffer(geoms, distance, quadSegs=30, workers=1):
+    """Buffers each geometry in a list
+
+    Parameters:
+    -----------
+    geoms : list of ogr.Geometry
+        The geometries to buffer
+
+    distance : float or array-like
+        The buffer distance, or one distance per geometry
+
+    quadSegs : int; optional
+        The number of segments used to approximate a quarter circle
+        * The default matches OGR's Buffer
+
+    workers : int; optional
+        The number of threads to use with the shapely backend
+
+    Returns:
+    --------
+    list of ogr.Geometry
+
+    """
+    geoms = list(geoms)
+    if len(geoms) == 0: return []
+
+    shapely = _shapely()
+    if shapely is None:
+        distances = np.broadcast_to(distance, (len(geoms),))
+        return [g.Buffer(float(d), quadSegs) for g, d in zip(geoms, distances)]
+
+    distance = np.broadcast_to(np.asarray(distance, dtype=np.float64), (len(geoms),))
+    result = _apply(lambda a, d: shapely.buffer(a, d, quad_segs=quadSegs),
+                    [toShapely(geoms), np.array(distance)], workers)
+    return toOgr(result, _srsOf(geoms))
+
+
+def makeValid(geoms, workers=1):
+    """Repairs invalid geometries (such as self-intersecting polygons)
+
+    * With the OGR backend, a zero-width buffer is used instead
+    """
+    geoms = list(geoms)
+    if len(geoms) == 0: return []
+
+    shapely = _shapely()
+    if shapely is None:
+        return [g if g.IsValid() else g.Buffer(0) for g in geoms]
+
+    result = _apply(shapely.make_valid, [toShapely(geoms)], workers)
+    return toOgr(result, _srsOf(geoms))
+
+
+def simplify(geoms, tolerance, preserveTopology=True, workers=1):
+    """Simplifies each geometry in a list
+
+    * No vertex moves by more than 'tolerance'
+    """
+    geoms = list(geoms)
+    if len(geoms) == 0: return []
+
+    shapely = _shapely()
+    if shapely is None:
+        if preserveTopology:
+            return [g.SimplifyPreserveTopology(tolerance) for g in geoms]
+        return [g.Simplify(tolerance) for g in geoms]
+
+    result = _apply(lambda a: shapely.simplify(a, tolerance, preserve_topology=preserveTopology),
+                    [toShapely(geoms)], workers)
+    return toOgr(result, _srsOf(geoms))
+
+
+def intersection(geoms, other, workers=1):
+    """Intersects each geometry in a list with another geometry
+
+    * Geometries which do not intersect are given as None
+    """
+    geoms = list(geoms)
+    if len(geoms) == 0: return []
+
+    shapely = _shapely()
+    if shapely is None:
+        output = []
+        for g in geoms:
+            i = g.Intersection(other)
+            output.append(None if i is None or i.IsEmpty() else i)
+        return output
+
+    other = toShapely([other])[0]
+    result = _apply(lambda a: shapely.intersection(a, other), [toShapely(geoms)], workers)
+    result[shapely.is_empty(result)] = None
+    return toOgr(result, _srsOf(geoms))
+
+
+def area(geoms):
+    """Computes the area of each geometry in a list"""
+    geoms = list(geoms)
+    shapely = _shapely()
+    if shapely is None or len(geoms) == 0:
+        return np.array([g.Area() for g in geoms])
+    return shapely.area(toShapely(geoms))
+
+
+def length(geoms):
+    """Computes the length (or perimeter) of each geometry in a list"""
+    geoms = list(geoms)
+    shapely = _shapely()
+    if shapely is None or len(geoms) == 0:
+        return np.array([g.Length() if "LINE" in g.GetGeometryName() else g.Boundary().Length() for g in geoms])
+    return shapely.length(toShapely(geoms))
+
+
+def deviation(original, simplified):
+    """Measures how much simplified geometries differ from the originals
+
+    * Lines are compared by their length, and polygons by their area
+
+    Returns:
+    --------
+    numpy.ndarray : The ratio of each simplified geometry's length (or area) 
+    to the original's
+
+    """
+    isLine = np.array(["LINE" in g.GetGeometryName() for g in simplified], dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(isLine, length(simplified)/length(original), area(simplified)/area(original))
+
+
+def union(geoms):
+    """Merges a list of geometries into a single geometry"""
+    geoms = [g for g in geoms if not g is None]
+    shapely = _shapely()
+    if shapely is None:
+        return gk.geom.flatten(geoms)
+    return toOgr([shapely.union_all(toShapely(geoms))], _srsOf(geoms))[0]
@@ -1,4 +1,8 @@
 from .util import *
+from copy import copy
+from . import geometry
+
+Prefetch = namedtuple('Prefetch', "ranges nbytes thread")
 
 # Sort out the data paths
 defaultPriorDir = join(dirname(dirname(__file__)), "data", "priors")
@@ -9,21 +13,45 @@ class PriorSource(object):
     accessible for use in general purpose geospatial analyses"""
     class _LoadFail(Exception):pass
 
-    def __init__(s, path):
-        """Initialize a PriorSource object by passing it a path on disk"""
+    def __init__(s, path, band=None):
+        """Initialize a PriorSource object by passing it a path on disk
+
+        * If 'band' is given, the Prior is read from that band of the raster 
+          and its metadata is taken from the band (as in a PriorCube)
+        * If a flat store header (.json) is given, windows and point values 
+          are served directly from a memory-mapped array (see 'saveFlat')
+        """
+        if splitext(path)[1].lower() == ".json":
+            # Other JSON files (such as manifests or configs) are not Priors
+            try:
+                with open(path) as fi:
+                    header = json.load(fi)
+                if not isinstance(header, dict) or header.get("GLAES_FLAT_PRIOR", "NO") != "YES": 
+                    raise PriorSource._LoadFail()
+
+                s._flat = np.load(join(dirname(path), header["data"]), mmap_mode="r")
+                path = join(dirname(path), header["raster"])
+            except (ValueError, KeyError, OSError):
+                raise PriorSource._LoadFail()
+        else:
+            s._flat = None
+
         s.path = path
+        s.band = 1 if band is None else band
         ds = gk.raster.loadRaster(path)
         ri = gk.raster.rasterInfo(ds)
+        meta = ri.meta if band is None else ds.GetRasterBand(band).GetMetadata()
 
         # Check if we're dealing with a GLAES prior
-        if ri.meta.get("GLAES_PRIOR", "NO") != "YES": raise PriorSource._LoadFail()
+        if meta.get("GLAES_PRIOR", "NO") != "YES": raise PriorSource._LoadFail()
+        s.meta = meta
 
         # Load basic values
-        s.displayName = ri.meta.get("DISPLAY_NAME", splitext(basename(path))[0])
+        s.displayName = meta.get("DISPLAY_NAME", splitext(basename(path))[0])
         
-        s.unit = ri.meta.get("UNIT", "Unknown")
-        s.description = ri.meta.get("DESCRIPTION", "Unknown")
-        s.alternateName = ri.meta.get("ALTERNATE_NAME", None)
+        s.unit = meta.get("UNIT", "Unknown")
+        s.description = meta.get("DESCRIPTION", "Unknown")
+        s.alternateName = meta.get("ALTERNATE_NAME", None)
 
         s.xMin = ri.xMin
         s.xMax = ri.xMax
@@ -34,9 +62,23 @@ class PriorSource(object):
         s.dx = ri.dx
         s.dy = ri.dy
 
+        # Find pre-aggregated pyramid levels next to the Prior
+        s.pyramids = OrderedDict()
+        pyramidRE = re.compile(r"\.pyramid_(?P<res>[0-9]+)\.tif$")
+        for f in sorted(glob(splitext(path)[0]+".pyramid_*.tif")):
+            m = pyramidRE.search(f)
+            if m is not None: s.pyramids[int(m.group("res"))] = f
+
+        # Distance priors store (scaled) distances directly instead of edge indices
+        s.isDistance = meta.get("PRIOR_FORMAT", "EDGES") == "DISTANCE"
+        if s.isDistance:
+            s._initDistance(meta)
+            return
+        s.rawNoData = 255
+
         # create edges and estimation-values
         try:
-            valMap = json.loads(ri.meta["VALUE_MAP"])
+            valMap = json.loads(meta["VALUE_MAP"])
         except Exception as e:
             print(path)
             raise e
@@ -111,6 +153,11 @@ class PriorSource(object):
         tmp.append(s.untouchedTight)
         s._values_tight = np.array(tmp)
 
+        # Make a full lookup from raw index to estimated value
+        s._lookup = np.full(256, np.nan)
+        s._lookup[:s.values.size] = s.values
+        s._lookup[254] = s.untouchedTight
+
         # Make the doc string
         doc = ""
         doc += "%s\n"%s.description
@@ -124,6 +171,88 @@ class PriorSource(object):
 
         s.__doc__ = doc
 
+    def _initDistance(s, meta):
+        """Sets up a Prior which stores quantized distances (see buildDistancePrior)"""
+        s.scale = float(meta.get("SCALE", 0.1))
+        s.rawNoData = 65535
+        s.maxValue = (s.rawNoData-1)*s.scale
+
+        # The only 'edges' are the boundaries of the representable range
+        s.edges = np.array([0, s.maxValue])
+        s.edgeStr = ["<=%.2f"%e for e in s.edges]
+        s.values = s.edges.copy()
+
+        s.untouchedTight = s.maxValue+s.scale
+        s.untouchedWide = s.maxValue+100000000000000 
+        s.noData = -999999
+
+        s._values_wide = np.append(s.values, s.untouchedWide)
+        s._values_tight = np.append(s.values, s.untouchedTight)
+
+        # Make the doc string
+        doc = ""
+        doc += "%s\n"%s.description
+        doc += "UNITS: %s\n"%s.unit
+        doc += "DISTANCE PRIOR:\n"
+        doc += "  Raw Value * {} = Distance, up to {:.3f}\n".format(s.scale, s.maxValue)
+        doc += "  {:^9} - no-data\n".format(s.rawNoData)
+
+        s.__doc__ = doc
+
+    def valueToIndex(s, value):
+        """Projects a value into the Prior's raw 'index space'
+
+        * For edge-based Priors, values between two edges are interpolated 
+          - Priors with descending edges (such as ">=" Priors) are handled 
+            by interpolating over the negated values
+        * For distance Priors, the raw space is exact
+        """
+        if s.isDistance:
+            return value/s.scale
+        if s._values_wide[-1] < s._values_wide[0]:
+            return np.interp(-np.asarray(value), -s._values_wide, np.arange(s._values_wide.size))
+        return np.interp(value, s._values_wide, np.arange(s._values_wide.size))
+
+    def rawToValue(s, raw):
+        """Converts raw values of the Prior into estimated values
+
+        * No-data is given as NaN
+        """
+        raw = np.asarray(raw)
+        if s.isDistance:
+            return np.where(raw==s.rawNoData, np.nan, raw*s.scale)
+        return s._lookup[raw]
+
+    def valueLookup(s, untouched='tight', knots=()):
+        """Creates a lookup table from raw values to estimated values, which 
+        can be linearly interpolated (as in a GDAL LUT)
+
+        * For distance Priors, additional 'knots' (in the Prior's units) can be
+          given, so that a piecewise-linear function of the value can be 
+          composed with the table exactly
+
+        Returns:
+        --------
+        OrderedDict : raw value -> estimated value
+        """
+        if untouched.lower()=='tight':
+            untouchedValue = s.untouchedTight
+        elif untouched.lower()=='wide':
+            untouchedValue = s.untouchedWide
+        else:
+            raise RuntimeError("'untouched' must be 'Tight' or 'Wide")
+
+        lookup = OrderedDict()
+        if s.isDistance:
+            raws = [0, s.rawNoData-1] + [k/s.scale for k in knots if 0 < k < s.maxValue]
+            for raw in sorted(set(raws)): lookup[raw] = raw*s.scale
+        else:
+            for i, v in enumerate(s.values): lookup[i] = v
+            lookup[254] = untouchedValue
+        lookup[s.rawNoData] = s.noData
+
+        return lookup
+
     def containsValue(s, val, verbose=False):
         """Checks if a given value is withing the known values in the Prior source
 
@@ -142,7 +271,10 @@ class PriorSource(object):
 
         * If 'verbose' is true, a warning is issued when the given value is more
         than 5% deviant from the closest precomputed edge
+        * Distance Priors can represent every value exactly
         """
+        if s.isDistance: return True
+
         bestI = np.argmin(np.abs(s.edges-val))
         bestEdge = s.edges[bestI]
 
@@ -156,7 +288,7 @@ class PriorSource(object):
             return False
 
     #### Make a datasource generator
-    def generateRaster(s, extent, untouched='tight', **kwargs):
+    def generateRaster(s, extent, untouched='tight', lazy=False, **kwargs):
         """Generates a raster datasource around the indicated extent
 
         Parameters:
@@ -176,6 +308,15 @@ class PriorSource(object):
             * If 'tight', pixels which are untouched are given a value slightly
               beyond than the final edge
             * If 'wide', they are given a value far away from the final edge
+
+        lazy: bool; optional
+            If True, a lightweight VRT datasource is returned instead of a 
+            materialized raster
+            * The index-to-value lookup is applied by GDAL only when blocks are 
+              read, so downstream warps stream through it without an 
+              intermediate copy
+            * Only the 'output' keyword argument is accepted, in which case 
+              the VRT is also written to disk
         
         **kwargs: 
             All keyword arguments are passed along to geokit.raster.mutateRaster
@@ -198,8 +339,21 @@ class PriorSource(object):
         else:
             raise RuntimeError("'untouched' must be 'Tight' or 'Wide")
 
+        if lazy:
+            unsupported = set(kwargs) - {"output"}
+            if unsupported:
+                raise GlaesError("Unsupported arguments when lazy=True: %s"%", ".join(sorted(unsupported)))
+
+            lookup = s.valueLookup(untouched)
+            return s.lookupRaster(extent, lookup, noData=s.noData, output=kwargs.get("output", None))
+
         # make a mutator function to make indexes to estimated values
         def mutator(data):
+            if s.isDistance:
+                result = data*s.scale
+                result[data == s.rawNoData] = s.noData
+                return result
+
             noData = data == 255 
             untouched = data == 254
             result = np.interp(data, range(len(values)), values)
@@ -208,14 +362,468 @@ class PriorSource(object):
             return result
 
         # mutate main source
-        mutDS = gk.raster.mutateRaster(s.path, bounds=extent.xyXY, boundsSRS=extent.srs, 
+        mutDS = gk.raster.mutateRaster(s.sourceFor(extent), bounds=extent.xyXY, boundsSRS=extent.srs, 
                                        processor=mutator, noData=s.noData, **kwargs)
 
         # return
         return mutDS
 
+    def lookupRaster(s, extent, lookup, noData=None, output=None, pad=0):
+        """Creates a VRT datasource which maps the Prior's raw edge indices 
+        through a lookup table as blocks are read
+
+        * Nothing is computed until the datasource is read (for example by a 
+          warp), and values between two given indices are linearly interpolated
+        * The VRT is aligned to the Prior's own grid
+
+        Parameters:
+        -----------
+        extent: geokit.Extent
+            The geographic boundaries which the datasource should cover
+
+        lookup: dict
+            A mapping from raw index values to output values
+
+        noData: numeric; optional
+            The no-data value of the output datasource
+            * By default, the Prior's no-data value is used
+            * The Prior's raw no-data index is always mapped to this value, 
+              rather than being interpolated from the lookup
+
+        output: str; optional
+            A path to write the VRT file to
+
+        pad: int; optional
+            A number of pixels by which to pad the extent
+            * Use this when the datasource will be resampled, so that values 
+              near the border remain well defined
+
+        Returns:
+        --------
+        gdal.Dataset
+
+        """
+        from osgeo import gdal
+        from xml.sax.saxutils import escape
+
+        extent = extent.castTo(s.srs).pad(pad*max(s.dx, s.dy)).fit((s.dx, s.dy))
+
+        xOff = int(round((extent.xMin-s.xMin)/s.dx))
+        yOff = int(round((s.yMax-extent.yMax)/s.dy))
+        xN = int(round((extent.xMax-extent.xMin)/s.dx))
+        yN = int(round((extent.yMax-extent.yMin)/s.dy))
+
+        if noData is None: noData = s.noData
+        lookup = dict(lookup)
+        lookup[s.rawNoData] = noData
+
+        lut = ",".join("%.17g:%.17g"%(k, v) for k, v in sorted(lookup.items()))
+        noDataElement = "<NoDataValue>%.17g</NoDataValue>"%noData
+
+        vrt = """<VRTDataset rasterXSize="{xN}" rasterYSize="{yN}">
+  <SRS>{srs}</SRS>
+  <GeoTransform>{xMin:.17g}, {dx:.17g}, 0, {yMax:.17g}, 0, {ndy:.17g}</GeoTransform>
+  <VRTRasterBand dataType="Float64" band="1">
+    {noData}
+    <ComplexSource>
+      <SourceFilename relativeToVRT="0">{path}</SourceFilename>
+      <SourceBand>{band}</SourceBand>
+      <SrcRect xOff="{xOff}" yOff="{yOff}" xSize="{xN}" ySize="{yN}"/>
+      <DstRect xOff="0" yOff="0" xSize="{xN}" ySize="{yN}"/>
+      <LUT>{lut}</LUT>
+    </ComplexSource>
+  </VRTRasterBand>
+</VRTDataset>""".format(xN=xN, yN=yN, srs=escape(s.srs.ExportToWkt()), xMin=extent.xMin, dx=s.dx, 
+                        yMax=extent.yMax, ndy=-s.dy, noData=noDataElement, path=escape(s.sourceFor(extent)), 
+                        band=s.band, xOff=xOff, yOff=yOff, lut=lut)
+
+        if output is None:
+            return gdal.Open(vrt)
+        else:
+            with open(output, "w") as fo: fo.write(vrt)
+            return gdal.Open(output)
+
+    def extractWindow(s, extent):
+        """Extracts the Prior's raw edge indices within the given extent
+
+        * The extent must be in the Prior's srs and fit to its resolution
+
+        Returns:
+        --------
+        numpy.ndarray of uint8 edge indices
+
+        """
+        xOff, yOff, xN, yN = windowOffsets(extent, s.xMin, s.yMax, s.dx, s.dy)
+
+        if s._flat is not None and xOff >= 0 and yOff >= 0 and \
+           xOff+xN <= s._flat.shape[1] and yOff+yN <= s._flat.shape[0]:
+            # Serve a view of the memory-mapped store, without copying
+            return s._flat[yOff:yOff+yN, xOff:xOff+xN]
+
+        return readWindow(s.sourceFor(extent), xOff, yOff, xN, yN, band=s.band, fill=s.rawNoData)
+
+    def sourceFor(s, extent):
+        """Returns the path of the raster which serves the Prior within the 
+        given extent
+
+        * The raster always shares the Prior's grid
+        """
+        return s.path
+
+    def extractRegion(s, region):
+        """Extracts the Prior's raw edge indices on the grid of a RegionMask
+
+        * When the grids match, the Prior's window is read directly
+        * Otherwise the indices are warped with nearest-neighbor resampling
+
+        Returns:
+        --------
+        numpy.ndarray of raw edge indices with the shape of the region's mask
+
+        """
+        if gridAligned(region, s.srs, s.xMin, s.yMax, s.dx, s.dy):
+            return s.extractWindow(region.extent)
+
+        from osgeo import gdal
+
+        source = s.sourceFor(region.extent.castTo(s.srs))
+        if s.band != 1:  # The prior lives in a PriorCube
+            source = gdal.Translate("", source, format="VRT", bandList=[s.band])
+
+        warped = gdal.Warp("", source, format="MEM", dstSRS=region.srs.ExportToWkt(),
+                           outputBounds=region.extent.xyXY, xRes=region.pixelWidth,
+                           yRes=region.pixelHeight, resampleAlg="near",
+                           srcNodata=s.rawNoData, dstNodata=s.rawNoData)
+        return warped.ReadAsArray()
+
+    def buildPyramid(s, resolutions=(200, 500, 1000, 5000), directory=None, cellsPerBlock=10000000):
+        """Builds pre-aggregated, coarse resolution versions of the Prior for 
+        quick-look analyses
+
+        * For each coarse cell, the percentage of the underlying Prior pixels 
+          which are at or below each edge is stored (one band per edge), rather 
+          than just a nearest-neighbor index
+        * Percentages are relative to the pixels with data, and cells without 
+          any data are given the no-data value (255)
+        * Coarse grids are aligned to multiples of their resolution
+        * Data is read as in 'extractWindow', so tiled Priors and flat stores 
+          are supported
+        * Levels are written next to the Prior as "<name>.pyramid_<res>.tif" and
+          are picked up automatically by ExclusionCalculator.excludePrior when 
+          the calculator's pixel size matches the level's resolution
+
+        Parameters:
+        -----------
+        resolutions: iterable
+            The coarse resolutions to build
+            * Each must be an integer multiple of the Prior's resolution
+
+        directory: str; optional
+            The directory to write into
+            * If None, the Prior's own directory is used 
+              - Pyramids are only found automatically in this case
+
+        cellsPerBlock: int; optional
+            The approximate number of (fine) Prior pixels to aggregate at once,
+            which limits memory usage
+
+        Returns:
+        --------
+        list : The paths to the generated pyramid levels
+
+        """
+        from osgeo import gdal
+
+        if s.isDistance:
+            raise GlaesError("%s: pyramids are only available for edge-based Priors"%s.displayName)
+
+        stem = splitext(basename(s.path))[0]
+        if directory is None: directory = dirname(s.path)
+        n = s.edges.size
+
+        outputs = []
+        for res in resolutions:
+            f = int(round(res/s.dx))
+            if not (np.isclose(f*s.dx, res) and np.isclose(f*s.dy, res)):
+                raise GlaesError("%s: resolution %s is not a multiple of the Prior's resolution"%(s.displayName, res))
+
+            # Define the coarse grid
+            cxMin = np.floor(s.xMin/res)*res
+            cyMax = np.ceil(s.yMax/res)*res
+            cxN = int(np.ceil((s.xMax-cxMin)/res))
+            cyN = int(np.ceil((cyMax-s.yMin)/res))
+
+            output = join(directory, "%s.pyramid_%d.tif"%(stem, res))
+            driver = gdal.GetDriverByName("GTiff")
+            ds = driver.Create(output, cxN, cyN, n, gdal.GDT_Byte, 
+                               ["TILED=YES", "COMPRESS=LZW", "INTERLEAVE=BAND", "BIGTIFF=IF_SAFER"])
+            ds.SetProjection(s.srs.ExportToWkt())
+            ds.SetGeoTransform((cxMin, res, 0, cyMax, 0, -res))
+
+            # Aggregate blocks of coarse rows, sized by the number of fine pixels
+            rowsPerBlock = max(1, int(cellsPerBlock//(cxN*f*f)))
+            for cy in range(0, cyN, rowsPerBlock):
+                k = min(rowsPerBlock, cyN-cy)
+                block = gk.Extent(cxMin, cyMax-(cy+k)*res, cxMin+cxN*res, cyMax-cy*res, srs=s.srs)
+                fine = s.extractWindow(block)
+
+                # Map indices onto bins: edges, beyond-the-last-edge, no-data
+                bins = np.minimum(fine, n).astype(np.uint8)
+                bins[fine==255] = n+1
+                bins = bins.reshape(k, f, cxN, f)
+
+                # Count each bin in each coarse cell
+                hist = np.empty((k*cxN, n+2), dtype=np.int32)
+                for b in range(n+2):
+                    hist[:,b] = (bins==b).sum(axis=(1,3), dtype=np.int32).ravel()
+
+                valid = hist[:,:n+1].sum(axis=1, keepdims=True)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    frac = np.round(np.cumsum(hist[:,:n], axis=1)/valid*100)
+                frac[valid[:,0]==0,:] = 255
+                frac = frac.astype(np.uint8).reshape(k, cxN, n)
+
+                for i in range(n):
+                    ds.GetRasterBand(i+1).WriteArray(frac[:,:,i], 0, cy)
+
+            # Set meta data
+            meta = dict(s.meta)
+            meta["DISPLAY_NAME"] = s.displayName
+            meta["GLAES_PRIOR"] = "NO"
+            meta["GLAES_PRIOR_PYRAMID"] = "YES"
+            meta["RESOLUTION"] = str(res)
+            ds.SetMetadata(meta)
+            for i in range(n):
+                band = ds.GetRasterBand(i+1)
+                band.SetNoDataValue(255)
+                band.SetDescription(s.edgeStr[i])
+            ds.FlushCache()
+            del ds
+
+            if directory == dirname(s.path): s.pyramids[int(res)] = output
+            outputs.append(output)
+
+        return outputs
+
+    def pyramidLevel(s, region):
+        """Returns the path to the pyramid level which matches a RegionMask's 
+        grid, or None if there is no such level"""
+        if not region.srs.IsSame(s.srs) or region.pixelWidth != region.pixelHeight: return None
+        
+        for res, path in s.pyramids.items():
+            if np.isclose(region.pixelWidth, res) and gridAligned(region, s.srs, 0, 0, res, res):
+                return path
+        return None
+
+    def extractFraction(s, extent, pyramid, low, high):
+        """Extracts the percentage of Prior pixels within each coarse cell whose
+        raw index lies within the inclusive bounds [low, high]
+
+        * The extent must be in the Prior's srs and fit to the pyramid level
+
+        Parameters:
+        -----------
+        extent: geokit.Extent
+            The geographic boundaries to extract
+
+        pyramid: str
+            The path to a pyramid level (see 'buildPyramid')
+
+        low, high: numeric
+            The inclusive index-space bounds (may be infinite)
+
+        Returns:
+        --------
+        numpy.ndarray of percentages
+
+        """
+        ri = gk.raster.rasterInfo(pyramid)
+        xOff, yOff, xN, yN = windowOffsets(extent, ri.xMin, ri.yMax, ri.dx, ri.dy)
+        n = s.edges.size
+
+        # Cumulative percentages at the upper bound, and just below the lower bound
+        def cumulative(i):
+            if i < 0: return np.zeros((yN, xN))
+            if i >= n: return np.full((yN, xN), 100.0)
+            mat = readWindow(pyramid, xOff, yOff, xN, yN, band=int(i)+1).astype(np.float64)
+            mat[mat==255] = np.nan
+            return mat
+
+        result = cumulative(np.floor(high)) - cumulative(np.ceil(low)-1)
+        result[np.isnan(result)] = 0
+        return result
+
+    def saveFlat(s, directory, rowsPerBlock=1024):
+        """Saves the Prior as a flat, uncompressed store which allows windows to
+        be served as memory-mapped array slices
+
+        The store consists of:
+          * <name>.npy  -> The raw edge indices (or distances) on the Prior's grid
+          * <name>.vrt  -> A raw VRT pointing into the .npy file, so that GDAL 
+                           based functions can still use the store
+          * <name>.json -> A header describing the grid and the Prior's meta data
+                           - Pass this file to PriorSource, or put the store in 
+                             a directory loaded by PriorSet
+
+        Parameters:
+        -----------
+        directory: str
+            The directory to write the store into
+
+        rowsPerBlock: int; optional
+            The number of rows to copy at once
+
+        Returns:
+        --------
+        str : The path to the header file
+
+        """
+        from xml.sax.saxutils import escape
+
+        xN = int(round((s.xMax-s.xMin)/s.dx))
+        yN = int(round((s.yMax-s.yMin)/s.dy))
+        
+        # Copy the raw indices into a memory-mapped .npy file
+        dtype = np.uint16 if s.isDistance else np.uint8
+        dataFile = s.displayName+".npy"
+        mm = np.lib.format.open_memmap(join(directory, dataFile), mode="w+", dtype=dtype, shape=(yN, xN))
+        for y in range(0, yN, rowsPerBlock):
+            n = min(rowsPerBlock, yN-y)
+            mm[y:y+n,:] = readWindow(s.path, 0, y, xN, n, band=s.band, fill=s.rawNoData)
+        mm.flush()
+        offset = mm.offset
+        del mm
+
+        # Write a raw VRT over the data
+        meta = dict(s.meta)
+        meta["DISPLAY_NAME"] = s.displayName
+        mdi = "".join('<MDI key="%s">%s</MDI>'%(escape(k), escape(v)) for k, v in meta.items())
+
+        rasterFile = s.displayName+".vrt"
+        vrt = """<VRTDataset rasterXSize="{xN}" rasterYSize="{yN}">
+  <SRS>{srs}</SRS>
+  <GeoTransform>{xMin:.17g}, {dx:.17g}, 0, {yMax:.17g}, 0, {ndy:.17g}</GeoTransform>
+  <Metadata>{mdi}</Metadata>
+  <VRTRasterBand dataType="{gdalType}" band="1" subClass="VRTRawRasterBand">
+    <NoDataValue>{rawNoData}</NoDataValue>
+    <SourceFilename relativetoVRT="1">{data}</SourceFilename>
+    <ImageOffset>{offset}</ImageOffset>
+    <PixelOffset>{size}</PixelOffset>
+    <LineOffset>{lineSize}</LineOffset>
+    <ByteOrder>LSB</ByteOrder>
+  </VRTRasterBand>
+</VRTDataset>""".format(xN=xN, yN=yN, srs=escape(s.srs.ExportToWkt()), xMin=s.xMin, dx=s.dx, 
+                        yMax=s.yMax, ndy=-s.dy, mdi=mdi, data=escape(dataFile), offset=offset,
+                        gdalType="UInt16" if s.isDistance else "Byte", rawNoData=s.rawNoData,
+                        size=np.dtype(dtype).itemsize, lineSize=xN*np.dtype(dtype).itemsize)
+        with open(join(directory, rasterFile), "w") as fo: fo.write(vrt)
+
+        # Write the header
+        header = OrderedDict()
+        header["GLAES_FLAT_PRIOR"] = "YES"
+        header["data"] = dataFile
+        header["raster"] = rasterFile
+        header["dtype"] = np.dtype(dtype).name
+        header["shape"] = [yN, xN]
+        header["offset"] = offset
+        header["xMin"] = s.xMin
+        header["yMax"] = s.yMax
+        header["dx"] = s.dx
+        header["dy"] = s.dy
+        header["srs"] = s.srs.ExportToWkt()
+        header["meta"] = meta
+
+        headerFile = join(directory, s.displayName+".json")
+        with open(headerFile, "w") as fo: json.dump(header, fo, indent=2)
+
+        return headerFile
+
+    def buildBitmapIndex(s, directory, blockSize=512):
+        """Builds a bitmap index of the Prior, which allows availability queries
+        to be answered without decoding any raster data (see PriorBitmapIndex)
+
+        * For each block of the Prior's grid and each edge index, a compressed
+          bitset marks the pixels whose index is less than or equal to the edge
+        * Blocks are aligned to absolute coordinates, so that the indexes of 
+          all Priors on the same grid share the same blocks
+        * Distance Priors are not supported
+
+        The index consists of:
+          * <name>.bitmap.bin  -> The zlib-compressed bitsets
+          * <name>.bitmap.npy  -> The offset and length of each bitset
+          * <name>.bitmap.json -> A header describing the grid and the Prior
+
+        Parameters:
+        -----------
+        directory: str
+            The directory to write the index into
+
+        blockSize: int; optional
+            The width and height of each block, in pixels
+            * Must be a multiple of 8
+
+        Returns:
+        --------
+        PriorBitmapIndex
+
+        """
+        import zlib
+
+        if s.isDistance:
+            raise GlaesError("%s: bitmap indexes are only available for edge-based Priors"%s.displayName)
+        if blockSize % 8 != 0:
+            raise GlaesError("blockSize must be a multiple of 8")
+
+        W, H = blockSize*s.dx, blockSize*s.dy
+        bx0 = int(np.floor(s.xMin/W + 1e-9))
+        bx1 = int(np.ceil(s.xMax/W - 1e-9))
+        by0 = int(np.floor(-s.yMax/H + 1e-9))
+        by1 = int(np.ceil(-s.yMin/H - 1e-9))
+
+        n = s.values.size
+        table = np.zeros((by1-by0, bx1-bx0, n+1, 2), dtype=np.int64)
+
+        dataFile = s.displayName+".bitmap.bin"
+        with open(join(directory, dataFile), "wb") as fo:
+            position = 0
+            for by in range(by0, by1):
+                yOff = int(round((s.yMax - (-by*H))/s.dy))
+                for bx in range(bx0, bx1):
+                    xOff = int(round((bx*W - s.xMin)/s.dx))
+                    indices = readWindow(s.path, xOff, yOff, blockSize, blockSize, band=s.band)
+
+                    # Layer 0 marks valid pixels, layer e+1 marks indices <= e
+                    layers = [indices != 255, ] + [indices <= e for e in range(n)]
+                    for li, layer in enumerate(layers):
+                        if not layer.any(): continue # Empty bitsets are not stored
+                        data = zlib.compress(np.packbits(layer).tobytes())
+                        fo.write(data)
+                        table[by-by0, bx-bx0, li] = (position, len(data))
+                        position += len(data)
+
+        indexFile = s.displayName+".bitmap.npy"
+        np.save(join(directory, indexFile), table)
+
+        # Write the header
+        header = OrderedDict()
+        header["GLAES_PRIOR_BITMAP"] = "YES"
+        header["displayName"] = s.displayName
+        header["data"] = dataFile
+        header["index"] = indexFile
+        header["blockSize"] = blockSize
+        header["blockOrigin"] = [bx0, by0]
+        header["dx"] = s.dx
+        header["dy"] = s.dy
+        header["srs"] = s.srs.ExportToWkt()
+        header["values"] = list(s._values_wide)
+
+        headerFile = join(directory, s.displayName+".bitmap.json")
+        with open(headerFile, "w") as fo: json.dump(header, fo, indent=2)
+
+        return PriorBitmapIndex(headerFile)
+
     #### Make a datasource generator
-    def generateVector(s, extent, value, output=None):
+    def generateVector(s, extent, value, output=None, method='buffer', tileSize=None):
         """Generates a vector datasource around the indicated extent and at an
         approximation at the indicated value
         
@@ -225,6 +833,7 @@ class PriorSource(object):
           polygonized and the resulting geometry is shrunk or grown to make up
           the difference
           - Be careful, this is a costly procedure! 
+          - Use method='contour' to avoid it
 
         Note:
         -----
@@ -250,6 +859,20 @@ class PriorSource(object):
         output: str; optional
             A place to put the output if its not needed in memory
 
+        method: str; optional
+            The reconstruction method to use
+            * If 'buffer', the closest edge is polygonized and then buffered
+              as described above
+            * If 'contour', the edge index field is interpolated to the requested
+              value and the resulting iso-line is traced with marching squares
+              - No geometric buffering is performed
+              - Requires the 'contourpy' package (shipped with matplotlib>=3.6)
+
+        tileSize: int; optional
+            When using method='contour', the extent is processed in square tiles
+            of this many pixels, which limits memory usage for large extents
+            * If None, the whole extent is processed at once
+
         Returns:
         --------
         gdal.Dataset
@@ -260,20 +883,29 @@ class PriorSource(object):
             extent = gk.Extent.load(extent)
         extent= extent.castTo(gk.srs.EPSG3035).fit(100)
 
-        # get closest edge
-        edgeDiffs = np.abs(value-s.edges)
-        edgeI = np.argmin( edgeDiffs )
-
-        # Extract the matrix around the extent and test against edge index
-        mat = extent.extractMatrix( s.path, strict=True ) <= edgeI
-        
-        # Polygonize
-        geoms = gk.geom.polygonizeMask(mat, bounds=extent.xyXY, srs=extent.srs, flat=False, shrink=False)
+        if method == 'contour':
+            geoms = s._contourGeoms(extent, value, tileSize)
+        elif s.isDistance:
+            # Distances are stored directly, so polygonizing is exact
+            mat = s.extractWindow(extent) <= s.valueToIndex(value)
+            geoms = gk.geom.polygonizeMask(mat, bounds=extent.xyXY, srs=extent.srs, flat=False, shrink=False)
+        elif method == 'buffer':
+            # get closest edge
+            edgeDiffs = np.abs(value-s.edges)
+            edgeI = np.argmin( edgeDiffs )
+
+            # Extract the matrix around the extent and test against edge index
+            mat = s.extractWindow(extent) <= edgeI
+            
+            # Polygonize
+            geoms = gk.geom.polygonizeMask(mat, bounds=extent.xyXY, srs=extent.srs, flat=False, shrink=False)
 
-        # Do extra grow
-        if edgeDiffs[edgeI]/s.edges[edgeI] > 0.01: 
-            extraDist = value-s.edges[edgeI]
-            geoms = [g.Buffer(extraDist) for g in geoms]
+            # Do extra grow
+            if edgeDiffs[edgeI]/s.edges[edgeI] > 0.01: 
+                extraDist = value-s.edges[edgeI]
+                geoms = geometry.buffer(geoms, extraDist)
+        else:
+            raise GlaesError("method must be 'buffer' or 'contour'")
 
         # merge to one geometry
         geom = gk.geom.flatten(geoms)
@@ -284,16 +916,129 @@ class PriorSource(object):
         # return
         return vecDS
 
+    def _contourGeoms(s, extent, value, tileSize=None):
+        """Traces the iso-line of 'value' through the Prior's edge index field
+        using marching squares, tile by tile, and returns the enclosed polygons"""
+        from contourpy import contour_generator, FillType
+
+        # Project the value into a fractional edge index
+        #  * Pixel centers take the Prior's estimated values, so interpolating
+        #    between them in index space places on-edge values exactly on the
+        #    pixel borders
+        #  * The level stays below the untouched (and no-data) indices, so 
+        #    that values beyond the last edge never enclose those pixels
+        #  * Distance Priors are traced directly in their raw space
+        level = float(s.valueToIndex(value))
+        level = min(level, s.rawNoData-1 if s.isDistance else s.values.size-1)
+
+        dx, dy = s.dx, s.dy
+        xN = int(round((extent.xMax-extent.xMin)/dx))
+        yN = int(round((extent.yMax-extent.yMin)/dy))
+        if tileSize is None: tileSize = max(xN, yN)
+        tiled = tileSize < max(xN, yN)
+
+        geoms = []
+        for y0 in range(0, yN, tileSize):
+            y1 = min(y0+tileSize, yN)
+            for x0 in range(0, xN, tileSize):
+                x1 = min(x0+tileSize, xN)
+
+                # Read the tile with a one pixel halo on inner sides, so that
+                # neighboring tiles trace identical lines along their seams
+                hy0, hy1 = max(y0-1, 0), min(y1+1, yN)
+                hx0, hx1 = max(x0-1, 0), min(x1+1, xN)
+                window = gk.Extent(extent.xMin+hx0*dx, extent.yMax-hy1*dy, 
+                                   extent.xMin+hx1*dx, extent.yMax-hy0*dy, srs=extent.srs)
+                mat = s.extractWindow(window)
+
+                # Make the index field (untouched and no-data lie beyond every edge)
+                field = mat.astype(np.float64)
+                if s.isDistance:
+                    field[mat==s.rawNoData] = s.rawNoData+1
+                else:
+                    field[mat==254] = s.values.size
+                    field[mat==255] = s.values.size+1
+
+                # Flip so that rows ascend in y, and set pixel-center coordinates
+                field = field[::-1,:]
+                xs = extent.xMin + (np.arange(hx0, hx1)+0.5)*dx
+                ys = extent.yMax - (np.arange(hy1-1, hy0-1, -1)+0.5)*dy
+
+                # Extend the field to the outer border of the extent
+                if hx0 == 0: 
+                    field = np.column_stack([field[:,0], field])
+                    xs = np.concatenate([[extent.xMin], xs])
+                if hx1 == xN: 
+                    field = np.column_stack([field, field[:,-1]])
+                    xs = np.concatenate([xs, [extent.xMax]])
+                if hy1 == yN: 
+                    field = np.vstack([field[0,:], field])
+                    ys = np.concatenate([[extent.yMin], ys])
+                if hy0 == 0: 
+                    field = np.vstack([field, field[-1,:]])
+                    ys = np.concatenate([ys, [extent.yMax]])
+
+                if field.min() > level: continue
+
+                # Trace filled contours
+                gen = contour_generator(x=xs, y=ys, z=field, fill_type=FillType.OuterOffset)
+                points, offsets = gen.filled(field.min()-1, level)
+
+                if tiled:
+                    core = gk.Extent(extent.xMin+x0*dx, extent.yMax-y1*dy, 
+                                     extent.xMin+x1*dx, extent.yMax-y0*dy, srs=extent.srs).box
+                
+                for pts, offs in zip(points, offsets):
+                    rings = [pts[offs[i]:offs[i+1]] for i in range(len(offs)-1)]
+                    geom = gk.geom.polygon(rings[0], *rings[1:], srs=extent.srs)
+                    if tiled:
+                        geom = geom.Intersection(core)
+                        if geom.IsEmpty(): continue
+                    geoms.append(geom)
+
+        return geoms
+
     def extractValues(s, points, **kwargs):
-        values = s.values.tolist()
-        values.append(s.untouchedTight)
+        """Extracts the Prior's estimated values at the given points
+
+        * When the Prior is loaded from a flat store and the points are given as
+          (x,y) coordinates, values are looked up directly in the memory-mapped
+          array
+        
+        kwargs
+            * All keyword arguments are passed on to a call to
+              geokit.raster.extractValues
+        """
+        if s._flat is not None and kwargs.get("winRange", 0) == 0:
+            try:
+                xy = np.array(points, dtype=np.float64)
+            except (TypeError, ValueError):
+                xy = None
+            
+            if xy is not None and xy.shape[-1:] == (2,):
+                single = xy.ndim == 1
+                xy = xy.reshape(-1, 2)
+
+                pointSRS = gk.srs.loadSRS(kwargs.get("pointSRS", "latlon"))
+                if not pointSRS.IsSame(s.srs):
+                    xy = np.array(gk.srs.xyTransform(xy, fromSRS=pointSRS, toSRS=s.srs, outputFormat="raw"))[:,:2]
+
+                cols = np.floor((xy[:,0]-s.xMin)/s.dx).astype(int)
+                rows = np.floor((s.yMax-xy[:,1])/s.dy).astype(int)
+                inside = (cols >= 0) & (cols < s._flat.shape[1]) & (rows >= 0) & (rows < s._flat.shape[0])
+
+                indicies = np.full(cols.size, s.rawNoData, dtype=s._flat.dtype)
+                indicies[inside] = s._flat[rows[inside], cols[inside]]
+
+                result = s.rawToValue(indicies)
+                return result[0] if single else result
 
         indicies = gk.raster.extractValues(s.path, points=points, **kwargs)
         
         if isinstance(indicies, list): 
-            return np.array([values[i.data] for i in indicies ])
+            return np.array([s.rawToValue(i.data) for i in indicies ])
         else: 
-            return values[indicies.data]
+            return s.rawToValue(indicies.data)
         
 # Load priors
 class PriorSet(object):
@@ -311,47 +1056,93 @@ class PriorSet(object):
         s.loadDirectory(path)
 
     def loadDirectory(s, path):
-        """Looks into a directory and attempts to load all raster (.tif) files as
-        if they were a Prior dataset
-
+        """Looks into a directory and attempts to load all raster (.tif) files,
+        and flat store headers (.json), as if they were a Prior dataset
+
+        * Sub-directories which hold several raster files sharing a display 
+          name (such as the per-region outputs of create_prior.py) are loaded 
+          as the tiles of a single Prior (see TiledPriorSource)
+          - Any other files in sub-directories are ignored
+        * Files in the directory itself which share a display name overwrite 
+          each other
         * Each call to this function adds to any other previously identified Priors
         """
-        for f in glob(join(path,"*.tif")):
-            if basename(f) == 'goodAreas.tif':continue
+        def skip(f):
+            return basename(f) == 'goodAreas.tif' or ".pyramid_" in basename(f) or ".bitmap." in basename(f)
+
+        priors = []
+        groups = OrderedDict()
+        for f in glob(join(path,"*.tif")) + glob(join(path,"*.json")):
+            if skip(f): continue
             
             try:
-
                 p = PriorSource(f)
-                
-                if hasattr(s,p.displayName): warn("Overwriting '%s'"%p.displayName, UserWarning)
-
-                s.sources[p.displayName] = p
-                setattr(s, p.displayName, p)
-                
-                if p.alternateName != "NONE":
-                    # make a new prior and update the displayName
-                    p2 = PriorSource(f)
-                    p2.displayName = p.alternateName
-                    s.sources[p.alternateName] = p2
-                    setattr(s, p.alternateName, p2)
+                groups.setdefault(p.displayName, []).append(p)
 
             except PriorSource._LoadFail:
                 warn("Could not parse file: %s"%(basename(f)), UserWarning)
 
-    def regionIsOkay(s, region):
-        """Checks if a given region is valid within the Prior Datasets
+        for name, group in groups.items():
+            if len(group) > 1: warn("Overwriting '%s'"%name, UserWarning)
+            priors.append(group[-1])
+
+        # Look for tiled Priors in sub-directories
+        for folder in sorted(glob(join(path, "*", ""))):
+            tiles = OrderedDict()
+            for f in glob(join(folder, "*.tif")):
+                if skip(f): continue
+                try:
+                    p = PriorSource(f)
+                    tiles.setdefault(p.displayName, []).append(p.path)
+                except PriorSource._LoadFail:
+                    pass
+
+            for name, paths in tiles.items():
+                if len(paths) > 1: priors.append(TiledPriorSource(paths))
+
+        for p in priors:
+            if hasattr(s,p.displayName): warn("Overwriting '%s'"%p.displayName, UserWarning)
+
+            s.sources[p.displayName] = p
+            setattr(s, p.displayName, p)
+            
+            if p.alternateName != "NONE":
+                # make a new prior and update the displayName
+                p2 = copy(p)
+                p2.displayName = p.alternateName
+                s.sources[p.alternateName] = p2
+                setattr(s, p.alternateName, p2)
+
+    def regionIsOkay(s, region, priorNames=None):
+        """Checks if a given region is covered by the Prior Datasets
+
+        * A pixel is covered by a Prior when the Prior is not no-data there
+        * The least covered of the checked Priors decides
+
+        Parameters:
+        -----------
+        region : geokit.RegionMask
+            The region to check
+
+        priorNames: list; optional
+            The names of the Priors to check
+            * If None, all loaded Priors are checked
+
+        Returns:
+        --------
+        bool
 
-        * Not really intended for external use and will probably fail
         """
-        # Check if region is okay
-        goodPixels = region.indicateValues(join(s.path,"goodArea.tif"), value=1).sum()
+        goodRatio = 1
+        for p in s._uniqueSources(priorNames):
+            indices = p.extractRegion(region)
+            goodRatio = min(goodRatio, (indices[region.mask] != p.rawNoData).mean())
 
-        goodRatio = goodPixels/region.mask.sum()
         if goodRatio > 0.9999:
             # Evertyhing is okay
             return True
         elif goodRatio > 0.95:
-            print("PRIORS-WARNING: A portion of the defined region is not included of the precalculated exclusion areas")
+            warn("A portion of the defined region is not included in the Prior datasets", UserWarning)
             return True
         else:
             return False
@@ -386,6 +1177,279 @@ class PriorSet(object):
 
         return output
 
+    def _uniqueSources(s, priorNames=None):
+        """Collects the named Priors, or else all Priors while skipping alternate names"""
+        if not priorNames is None:
+            return [s[name] for name in priorNames]
+
+        sources = []
+        for p in s.sources.values():
+            if not any(p.path == o.path and p.band == o.band for o in sources): sources.append(p)
+        return sources
+
+    def prefetch(s, regions, priorNames=None, background=True, method="auto"):
+        """Warms the operating system's page cache with the parts of the Prior 
+        files which a batch of regions will read
+
+        * The exact byte ranges of the touched GeoTIFF blocks (or flat store 
+          rows) are computed for each region and Prior, and are then either 
+          advised to the kernel (posix_fadvise WILLNEED) or read once
+        * On shared network storage this overlaps the cold-cache reads with
+          computation, when called before a batch of ExclusionCalculator runs
+        * Nothing about the Priors is changed, so the function is always safe 
+          to call
+
+        Parameters:
+        -----------
+        regions : iterable
+            The regions which will be analyzed
+            * Each may be a geokit.RegionMask, a geokit.Extent, or anything
+              acceptable to geokit.Extent.load
+
+        priorNames: list; optional
+            The names of the Priors to prefetch
+            * If None, all loaded Priors are prefetched
+
+        background : bool; optional
+            If True, the prefetching is done in a background thread and the
+            function returns immediately
+
+        method : str; optional
+            * If 'fadvise', the ranges are advised to the kernel with 
+              os.posix_fadvise (only available on POSIX systems)
+            * If 'read', the ranges are read once
+            * If 'auto', 'fadvise' is used when available
+
+        Returns:
+        --------
+        Prefetch : namedtuple
+            - Prefetch.ranges : An OrderedDict of file paths to lists of 
+              (offset, length) byte ranges
+            - Prefetch.nbytes : The total number of bytes in the ranges
+            - Prefetch.thread : The background thread, or None
+
+        """
+        import os
+        from threading import Thread
+
+        if method == "auto":
+            method = "fadvise" if hasattr(os, "posix_fadvise") else "read"
+        if not method in ["fadvise", "read"]:
+            raise GlaesError("method must be 'auto', 'fadvise' or 'read'")
+
+        sources = s._uniqueSources(priorNames)
+
+        # Plan the byte ranges
+        ranges = OrderedDict()
+        for region in regions:
+            if isinstance(region, gk.RegionMask): extent = region.extent
+            elif isinstance(region, gk.Extent): extent = region
+            else: extent = gk.Extent.load(region)
+
+            for p in sources:
+                ext = extent.castTo(p.srs).pad(2*max(p.dx, p.dy)).fit((p.dx, p.dy))
+
+                if p._flat is not None:
+                    # Rows of the flat store are contiguous
+                    xOff, yOff, xN, yN = windowOffsets(ext, p.xMin, p.yMax, p.dx, p.dy)
+                    x0, x1 = max(xOff, 0), min(xOff+xN, p._flat.shape[1])
+                    y0, y1 = max(yOff, 0), min(yOff+yN, p._flat.shape[0])
+                    if x1 <= x0 or y1 <= y0: continue
+
+                    size = p._flat.dtype.itemsize
+                    rowStarts = p._flat.offset + (np.arange(y0, y1)*p._flat.shape[1] + x0)*size
+                    ranges.setdefault(p._flat.filename, []).extend((int(r), (x1-x0)*size) for r in rowStarts)
+                    continue
+
+                files = p.tilesFor(ext) if isinstance(p, TiledPriorSource) else [p.path, ]
+                for f in files:
+                    ranges.setdefault(f, []).extend(blockRanges(f, ext, band=p.band))
+
+        for f in list(ranges.keys()):
+            ranges[f] = mergeRanges(ranges[f])
+            if len(ranges[f]) == 0: del ranges[f]
+
+        nbytes = sum(n for r in ranges.values() for _, n in r)
+
+        # Issue the reads
+        def fetch():
+            for f, rngs in ranges.items():
+                with open(f, "rb") as fi:
+                    for offset, length in rngs:
+                        if method == "fadvise":
+                            os.posix_fadvise(fi.fileno(), offset, length, os.POSIX_FADV_WILLNEED)
+                        else:
+                            fi.seek(offset)
+                            fi.read(length)
+
+        if background:
+            thread = Thread(target=fetch, name="glaes-prefetch", daemon=True)
+            thread.start()
+        else:
+            fetch()
+            thread = None
+
+        return Prefetch(ranges, nbytes, thread)
+
+    def buildRegionHistograms(s, source, output, idField=None, where=None, priorNames=None):
+        """Builds a table of the cumulative edge-index histograms of several 
+        Priors within each region of a reference partition (such as all NUTS-3
+        regions), which can be loaded as a PriorHistograms object
+
+        * Each region is rasterized on the grid of the first Prior, and the
+          Priors' indices are counted within the region's mask
+        * Distance Priors are not supported
+
+        Parameters:
+        -----------
+        source : str
+            The vector source containing the regions
+
+        output : str
+            The path of the output table
+            * Must end in ".csv"
+
+        idField : str; optional
+            The attribute which identifies each region
+            * If None, the feature index is used
+
+        where : str; optional
+            A filtering statement to apply to the source's features
+
+        priorNames: list; optional
+            The names of the Priors to include
+            * If None, all loaded Priors are included (alternate names are 
+              skipped)
+
+        Returns:
+        --------
+        PriorHistograms
+
+        """
+        sources = s._uniqueSources(priorNames)
+        for p in sources:
+            if p.isDistance: raise GlaesError("%s: distance Priors cannot be stored in a histogram table"%p.displayName)
+
+        first = sources[0]
+        features = gk.vector.extractFeatures(source, where=where)
+
+        rows = []
+        index = []
+        for i, feature in features.iterrows():
+            name = i if idField is None else feature[idField]
+            region = gk.RegionMask.fromGeom(feature.geom, srs=first.srs, pixelRes=first.dx)
+
+            for p in sources:
+                indices = p.extractRegion(region)[region.mask]
+                cumulative = np.cumsum(np.bincount(indices.ravel(), minlength=256))
+
+                row = OrderedDict()
+                row["values"] = json.dumps(list(p._values_wide))
+                row["pixels"] = int(region.mask.sum())
+                row["pixelArea"] = region.pixelWidth*region.pixelHeight
+                for j, c in enumerate(cumulative): row[str(j)] = int(c)
+
+                rows.append(row)
+                index.append((name, p.displayName))
+
+        table = pd.DataFrame(rows, index=pd.MultiIndex.from_tuples(index, names=["region", "prior"]))
+        table.to_csv(output)
+
+        return PriorHistograms(output)
+
+    def buildFlatStore(s, directory, priorNames=None):
+        """Saves a group of Priors as flat, memory-mappable stores 
+        (see PriorSource.saveFlat)
+
+        * The directory can afterwards be loaded with PriorSet.loadDirectory
+
+        Parameters:
+        -----------
+        directory: str
+            The directory to write the stores into
+
+        priorNames: list; optional
+            The names of the Priors to include
+            * If None, all loaded Priors are included (alternate names are 
+              skipped)
+
+        Returns:
+        --------
+        list : The paths to the header files
+
+        """
+        sources = s._uniqueSources(priorNames)
+
+        return [p.saveFlat(directory) for p in sources]
+
+    def buildCube(s, output, priorNames=None, blockSize=256, compress="LZW"):
+        """Stores a group of Priors as the bands of a single grid-aligned, 
+        pixel-interleaved and tiled raster, which can be loaded as a PriorCube
+
+        * All Priors must share the same srs and resolution
+        * The cube covers the union of the Priors' extents, and areas which a 
+          Prior does not cover are given the no-data value (255)
+
+        Parameters:
+        -----------
+        output: str
+            The path of the output raster file
+            * Must end in ".tif"
+
+        priorNames: list; optional
+            The names of the Priors to include
+            * If None, all loaded Priors are included (alternate names are 
+              skipped)
+
+        blockSize: int; optional
+            The tile size of the output raster
+
+        compress: str; optional
+            The GeoTIFF compression to apply
+
+        Returns:
+        --------
+        PriorCube
+
+        """
+        from osgeo import gdal
+
+        sources = s._uniqueSources(priorNames)
+
+        if any(p.isDistance for p in sources):
+            raise GlaesError("Distance Priors cannot be stored in a cube")
+
+        for p in sources[1:]:
+            if not (p.srs.IsSame(sources[0].srs) and p.dx == sources[0].dx and p.dy == sources[0].dy):
+                raise GlaesError("Priors must share the same srs and resolution to be stored in one cube")
+
+        # Stack the priors as separate bands of a virtual raster, and write it out
+        srcs = []
+        for p in sources:
+            if p.band == 1: srcs.append(p.path)
+            else: srcs.append(gdal.Translate("", p.path, format="VRT", bandList=[p.band]))
+
+        vrt = gdal.BuildVRT("", srcs, separate=True, srcNodata=255, VRTNodata=255)
+        
+        cube = gdal.Translate(output, vrt, format="GTiff", noData=255,
+                              creationOptions=["TILED=YES", "INTERLEAVE=PIXEL", "COMPRESS=%s"%compress,
+                                               "BLOCKXSIZE=%d"%blockSize, "BLOCKYSIZE=%d"%blockSize,
+                                               "BIGTIFF=IF_SAFER"])
+
+        # Set meta data
+        cube.SetMetadataItem("GLAES_PRIOR_CUBE", "YES")
+        for i, p in enumerate(sources):
+            band = cube.GetRasterBand(i+1)
+            band.SetDescription(p.displayName)
+            meta = dict(p.meta)
+            meta["DISPLAY_NAME"] = p.displayName
+            band.SetMetadata(meta)
+
+        cube.FlushCache()
+        del cube
+
+        return PriorCube(output)
+
     def combinePriors(s, reg, priorNames, combiner='min'):
         """Combines two or more priors into a single prior
 
@@ -408,5 +1472,566 @@ class PriorSet(object):
         return outputRaster
 
 
+class PriorHistograms(object):
+    """The PriorHistograms object answers availability questions for many 
+    regions at once from a table of per-region Prior histograms (see 
+    PriorSet.buildRegionHistograms), without touching any raster data
+
+    * For a single Prior, the availability is exact
+    * For several Priors, the overlap of their exclusions is unknown, so lower
+      and upper bounds of the availability are given
+    * Results assume that each region starts as fully available
+    """
+    def __init__(s, path):
+        """Initialize a PriorHistograms object by passing it a path on disk"""
+        s.path = path
+        s.table = pd.read_csv(path, index_col=[0, 1])
+
+    @property
+    def regions(s):
+        """The regions in the table"""
+        return list(s.table.index.get_level_values("region").unique())
+
+    @property
+    def priors(s):
+        """The names of the Priors in the table"""
+        return list(s.table.index.get_level_values("prior").unique())
+
+    def _excludedPixels(s, exclusions):
+        """Counts the excluded pixels of each region for each of the given 
+        Prior exclusions"""
+        columns = [str(i) for i in range(256)]
+
+        result = OrderedDict()
+        for name, value in exclusions.items():
+            table = s.table.xs(name, level="prior")
+            valuesWide = np.array(json.loads(table["values"].iloc[0]))
+
+            try:
+                v1, v2 = value
+            except TypeError:
+                v1, v2 = value, value
+
+            # Project to 'index space' (see PriorSource.valueToIndex)
+            low = -np.inf if v1 is None else np.interp(v1, valuesWide, np.arange(valuesWide.size))
+            high = np.inf if v2 is None else np.interp(v2, valuesWide, np.arange(valuesWide.size))
+
+            # Indices which satisfy low <= i <= high are excluded
+            #  * The no-data index (255) is never excluded, as in excludePrior
+            cumulative = table[columns].values
+            highI = int(np.clip(np.floor(high), -1, 254))
+            lowI = int(np.clip(np.ceil(low), 0, 255))
+            below = cumulative[:, highI] if highI >= 0 else 0
+            under = cumulative[:, lowI-1] if lowI >= 1 else 0
+
+            result[name] = pd.Series(np.maximum(below - under, 0), index=table.index)
+
+        return pd.DataFrame(result)
+
+    def percentAvailable(s, exclusions):
+        """Evaluates the percent of each region which remains available after 
+        excluding each of the given Priors by the given values
+
+        Parameters:
+        -----------
+        exclusions : dict
+            The Priors and values to exclude
+            * Keys are Prior names
+            * Values are the exact value, or value range to exclude, following
+              the conventions of ExclusionCalculator.excludePrior
+
+        Returns:
+        --------
+        pandas.DataFrame
+            * Indexed by region
+            * Columns are 'lower' and 'upper', which are equal when a single 
+              Prior is given
+
+        """
+        excluded = s._excludedPixels(exclusions)
+        pixels = s.table.xs(excluded.columns[0], level="prior")["pixels"]
+
+        result = pd.DataFrame(index=excluded.index)
+        result["lower"] = 100 * (pixels - np.minimum(excluded.sum(axis=1), pixels)) / pixels
+        result["upper"] = 100 * (pixels - excluded.max(axis=1)) / pixels
+        return result
+
+    def areaAvailable(s, exclusions):
+        """Evaluates the area of each region which remains available after 
+        excluding each of the given Priors by the given values (see 
+        PriorHistograms.percentAvailable)
+            * Units are defined by the srs of the Priors"""
+        percent = s.percentAvailable(exclusions)
+        first = s.table.xs(list(exclusions.keys())[0], level="prior")
+        regionArea = first["pixels"] * first["pixelArea"]
+
+        return percent.multiply(regionArea / 100, axis=0)
+
+
+# Number of set bits in each byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+class PriorBitmapIndex(object):
+    """The PriorBitmapIndex object answers availability questions about 
+    threshold exclusions of a Prior from its bitmap index (see 
+    PriorSource.buildBitmapIndex), without decoding any raster data
+
+    * Exclusions become logical operations on compressed bitsets, and the
+      available area is found by counting the bits within the region's mask
+    * Exclusions of several Priors are combined with 'bitmapAvailability'
+    * Results assume that the region starts as fully available, and are 
+      identical to excluding each Prior with ExclusionCalculator.excludePrior
+      on the Prior's grid
+    """
+    def __init__(s, path):
+        """Initialize a PriorBitmapIndex object by passing it the path of the
+        index's header (.json) on disk"""
+        with open(path) as fi:
+            header = json.load(fi)
+        if header.get("GLAES_PRIOR_BITMAP", "NO") != "YES": raise PriorSource._LoadFail()
+
+        s.path = path
+        s.displayName = header["displayName"]
+        s.blockSize = header["blockSize"]
+        s.bx0, s.by0 = header["blockOrigin"]
+        s.dx = header["dx"]
+        s.dy = header["dy"]
+        s.srs = gk.srs.loadSRS(header["srs"])
+        s._values_wide = np.array(header["values"])
+        s.edgeCount = s._values_wide.size - 1
+
+        s._table = np.load(join(dirname(path), header["index"]))
+        s._data = np.memmap(join(dirname(path), header["data"]), dtype=np.uint8, mode="r")
+
+    def valueToIndex(s, value):
+        """Projects a value into the Prior's edge 'index space'"""
+        return np.interp(value, s._values_wide, np.arange(s._values_wide.size))
+
+    def _layer(s, bx, by, li):
+        """Returns the packed bitset of one layer of a block"""
+        import zlib
+
+        size = s.blockSize*s.blockSize//8
+        j, i = by-s.by0, bx-s.bx0
+        if not (0 <= j < s._table.shape[0] and 0 <= i < s._table.shape[1]): 
+            return np.zeros(size, dtype=np.uint8)
+
+        offset, length = s._table[j, i, li]
+        if length == 0: return np.zeros(size, dtype=np.uint8)
+
+        return np.frombuffer(zlib.decompress(s._data[offset:offset+length].tobytes()), dtype=np.uint8)
+
+    def _cumulativeBits(s, bx, by, k):
+        """Returns the packed bitset of the valid pixels whose index is <= k"""
+        if k < 0: return np.zeros(s.blockSize*s.blockSize//8, dtype=np.uint8)
+        elif k >= 254: return s._layer(bx, by, 0)
+        else: return s._layer(bx, by, min(k, s.edgeCount-1)+1)
+
+    def excludedBits(s, bx, by, value):
+        """Returns the packed bitset of the pixels of a block which are excluded
+        by the given value, or value range (following the conventions of 
+        ExclusionCalculator.excludePrior)"""
+        try:
+            v1, v2 = value
+        except TypeError:
+            v1, v2 = value, value
+
+        low = -np.inf if v1 is None else s.valueToIndex(v1)
+        high = np.inf if v2 is None else s.valueToIndex(v2)
+
+        # The no-data index (255) is never excluded, as in excludePrior
+        highK = int(np.clip(np.floor(high), -1, 254))
+        lowK = int(np.clip(np.ceil(low), 0, 255))
+
+        return s._cumulativeBits(bx, by, highK) & ~s._cumulativeBits(bx, by, lowK-1)
+
+    def percentAvailable(s, region, value):
+        """The percent of the region which remains available after excluding 
+        the Prior by the given value (see bitmapAvailability)"""
+        return bitmapAvailability(region, {s: value})[0]
+
+    def areaAvailable(s, region, value):
+        """The area of the region which remains available after excluding the
+        Prior by the given value (see bitmapAvailability)"""
+        return bitmapAvailability(region, {s: value})[1]
+
+
+def bitmapAvailability(region, exclusions):
+    """Evaluates the availability of a region after excluding several Priors,
+    using their bitmap indexes (see PriorBitmapIndex)
+
+    * The region must lie on the grid of the indexes
+    * All indexes must share the same grid and block size
+
+    Parameters:
+    -----------
+    region : geokit.RegionMask
+        The region to evaluate
+
+    exclusions : dict
+        The exclusions to apply
+        * Keys are PriorBitmapIndex objects
+        * Values are the exact value, or value range to exclude, following the
+          conventions of ExclusionCalculator.excludePrior
+
+    Returns:
+    --------
+    tuple : (percentAvailable, areaAvailable)
+
+    """
+    indexes = list(exclusions.keys())
+    first = indexes[0]
+    for idx in indexes[1:]:
+        if not (idx.srs.IsSame(first.srs) and idx.blockSize == first.blockSize and 
+                np.isclose(idx.dx, first.dx) and np.isclose(idx.dy, first.dy)):
+            raise GlaesError("Bitmap indexes must share the same grid and block size")
+    
+    B = first.blockSize
+    W, H = B*first.dx, B*first.dy
+    if not gridAligned(region, first.srs, 0, 0, first.dx, first.dy):
+        raise GlaesError("The region must lie on the grid of the bitmap indexes")
+
+    # Find the blocks which the region touches
+    xMin, yMin, xMax, yMax = region.extent.xyXY
+    bx0, bx1 = int(np.floor(xMin/W + 1e-9)), int(np.ceil(xMax/W - 1e-9))
+    by0, by1 = int(np.floor(-yMax/H + 1e-9)), int(np.ceil(-yMin/H - 1e-9))
+
+    available = 0
+    for by in range(by0, by1):
+        for bx in range(bx0, bx1):
+            # Place the region's mask into the block
+            block = np.zeros((B, B), dtype=bool)
+            xOff = int(round((bx*W - xMin)/first.dx))
+            yOff = int(round((yMax + by*H)/first.dy))
+            x0, y0 = max(xOff, 0), max(yOff, 0)
+            x1 = min(xOff+B, region.mask.shape[1])
+            y1 = min(yOff+B, region.mask.shape[0])
+            if x1 <= x0 or y1 <= y0: continue
+
+            block[y0-yOff:y1-yOff, x0-xOff:x1-xOff] = region.mask[y0:y1, x0:x1]
+            bits = np.packbits(block)
+            if not bits.any(): continue
+
+            # Remove all excluded pixels
+            for idx, value in exclusions.items():
+                bits &= ~idx.excludedBits(bx, by, value)
+
+            available += int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+    percent = 100 * available / region.mask.sum()
+    area = available * region.pixelWidth * region.pixelHeight
+    return percent, area
+
+
+class _MemoryFiles(OrderedDict):
+    """Keeps track of in-memory (/vsimem/) files, and unlinks them once no 
+    object refers to them anymore
+
+    * Shallow copies of a Prior share the same instance, so the files stay
+      available as long as any of the copies exists
+    """
+    def __del__(s):
+        from osgeo import gdal
+        for path in s.values():
+            gdal.Unlink(path)
+
+
+class TiledPriorSource(PriorSource):
+    """The TiledPriorSource object combines many raster files which share a 
+    display name (such as the per-region outputs of create_prior.py) into a 
+    single Prior
+
+    * All tiles must share the same srs, resolution and value map
+    * The footprints of the tiles are indexed, so that only the tiles which
+      intersect a requested extent are assembled into a virtual raster (see 
+      'sourceFor'), without copying any data
+    * Otherwise the object behaves exactly like a PriorSource
+    """
+    def __init__(s, paths):
+        """Initialize a TiledPriorSource object by passing it the paths of the
+        tiles on disk"""
+        from osgeo import gdal
+        from uuid import uuid4
+
+        paths = sorted(paths)
+        infos = [gk.raster.rasterInfo(p) for p in paths]
+
+        first = infos[0]
+        for p, ri in zip(paths[1:], infos[1:]):
+            if not (ri.srs.IsSame(first.srs) and np.isclose(ri.dx, first.dx) and np.isclose(ri.dy, first.dy) and
+                    all(ri.meta.get(k) == first.meta.get(k) for k in ["VALUE_MAP", "PRIOR_FORMAT", "SCALE"])):
+                raise GlaesError("%s: all tiles of a Prior must share the same srs, resolution and value map"%basename(p))
+
+        s.tiles = paths
+        s._footprints = np.array([ri.bounds for ri in infos]) # xMin, yMin, xMax, yMax
+        noData = 65535 if first.meta.get("PRIOR_FORMAT") == "DISTANCE" else 255
+        s._vrts = _MemoryFiles()
+
+        # Mosaic all tiles into one virtual raster carrying the Prior's meta data
+        mosaic = "/vsimem/glaes_tiled_prior_%s.vrt"%uuid4().hex
+        s._vrts[tuple(paths)] = mosaic
+        vrt = gdal.BuildVRT(mosaic, paths, srcNodata=noData, VRTNodata=noData)
+        vrt.SetMetadata(dict(first.meta))
+        vrt.FlushCache()
+        del vrt
+
+        PriorSource.__init__(s, mosaic)
+
+    def tilesFor(s, extent):
+        """Returns the paths of the tiles which intersect the given extent"""
+        xMin, yMin, xMax, yMax = extent.castTo(s.srs).xyXY
+        fp = s._footprints
+        sel = (fp[:,0] < xMax) & (fp[:,2] > xMin) & (fp[:,1] < yMax) & (fp[:,3] > yMin)
+        return [s.tiles[i] for i in np.nonzero(sel)[0]]
+
+    def sourceFor(s, extent):
+        """Returns the path of a virtual raster which contains only the tiles 
+        intersecting the given extent
+
+        * The virtual raster covers the Prior's full bounds, so it shares the 
+          Prior's grid
+        * One virtual raster is kept per set of tiles, and all are released
+          together with the Prior
+        """
+        from osgeo import gdal
+        from uuid import uuid4
+
+        tiles = s.tilesFor(extent)
+        if len(tiles) == 0 or len(tiles) == len(s.tiles): return s.path
+
+        key = tuple(tiles)
+        if not key in s._vrts:
+            path = "/vsimem/glaes_tiled_prior_%s.vrt"%uuid4().hex
+            vrt = gdal.BuildVRT(path, tiles, srcNodata=s.rawNoData, VRTNodata=s.rawNoData, 
+                                outputBounds=(s.xMin, s.yMin, s.xMax, s.yMax))
+            vrt.FlushCache()
+            del vrt
+            s._vrts[key] = path
+
+        return s._vrts[key]
+
+
+def buildDistancePrior(region, source, output, name, where=None, scale=0.1, unit="meters", description=None, alternateName="NONE", **kwargs):
+    """Builds a Prior which stores the (quantized) distance to the features of a
+    vector source, rather than a list of precomputed edges
+
+    * Distances are computed with a Euclidean distance transform between pixel
+      centers, and stored as uint16 multiples of 'scale'
+      - With the default scale of 0.1 (decimetres for a meter-based srs) 
+        distances up to 6553.4 are representable, larger distances saturate
+      - Use a larger scale for priors which need a longer range
+    * Any threshold can then be evaluated exactly with a single comparison in
+      ExclusionCalculator.excludePrior, without any VALUE_MAP lookup
+    * Features outside of the region are not seen, so pad the region by the 
+      largest distance of interest when building tiles
+
+    Parameters:
+    -----------
+    region : geokit.RegionMask, or anything acceptable to geokit.RegionMask.load
+        The region (and grid) to build the Prior over
+        * Should be on the shared Prior grid (EPSG3035 at 100 m)
+
+    source : str
+        The vector source containing the features to measure distances to
+
+    output : str
+        The path of the output raster file
+
+    name : str
+        The display name of the Prior
+
+    where : str; optional
+        A filtering statement to apply to the source's features
+
+    scale : float; optional
+        The distance represented by one raw unit
+
+    unit, description, alternateName : str; optional
+        Meta data of the Prior
+
+    kwargs
+        * All other keyword arguments are passed on to a call to
+          geokit.RegionMask.load
+
+    Returns:
+    --------
+    PriorSource
+
+    """
+    from scipy.ndimage import distance_transform_edt
+
+    region = gk.RegionMask.load(region, **kwargs)
+    features = region.indicateFeatures(source, where=where, applyMask=False) > 0.5
+
+    if features.any():
+        dist = distance_transform_edt(~features, sampling=(region.pixelHeight, region.pixelWidth))
+    else:
+        dist = np.full(features.shape, np.inf)
+
+    raw = np.minimum(np.round(dist/scale), 65534).astype(np.uint16)
+    raw[~region.mask] = 65535
+
+    meta = OrderedDict()
+    meta["GLAES_PRIOR"] = "YES"
+    meta["PRIOR_FORMAT"] = "DISTANCE"
+    meta["SCALE"] = "%g"%scale
+    meta["DISPLAY_NAME"] = name
+    meta["ALTERNATE_NAME"] = alternateName
+    meta["DESCRIPTION"] = "Distance to the nearest feature" if description is None else description
+    meta["UNIT"] = unit
+    meta["SOURCE"] = source if isinstance(source, str) else "Unknown"
+
+    region.createRaster(output=output, data=raw, noData=65535, meta=meta, overwrite=True)
+    return PriorSource(output)
+
+
+class PriorCube(object):
+    """The PriorCube object loads a group of Priors which are stored as the 
+    bands of a single grid-aligned raster (see PriorSet.buildCube)
+
+    * Individual bands are available as PriorSource objects using the 
+      PriorCube[<name>] convention
+    * A window of all Priors can be read in a single pass using 'extractWindow'
+    """
+    def __init__(s, path):
+        """Initialize a PriorCube object by passing it a path on disk"""
+        ds = gk.raster.loadRaster(path)
+        ri = gk.raster.rasterInfo(ds)
+
+        if ri.meta.get("GLAES_PRIOR_CUBE", "NO") != "YES": raise PriorSource._LoadFail()
+
+        s.path = path
+        s.srs = ri.srs
+        s.xMin = ri.xMin
+        s.xMax = ri.xMax
+        s.yMin = ri.yMin
+        s.yMax = ri.yMax
+        s.bounds = ri.bounds
+        s.dx = ri.dx
+        s.dy = ri.dy
+
+        s.sources = OrderedDict()
+        for b in range(1, ds.RasterCount+1):
+            p = PriorSource(path, band=b)
+            s.sources[p.displayName] = p
+
+    @property
+    def names(s):
+        """The names of the Priors in the cube, in band order"""
+        return list(s.sources.keys())
+
+    def __getitem__(s, prior):
+        return s.sources[prior]
+
+    def extractWindow(s, extent, priorNames=None):
+        """Extracts the raw edge indices of several Priors within the given extent
+
+        * The extent must be in the cube's srs and fit to its resolution
+
+        Returns:
+        --------
+        numpy.ndarray of uint8 edge indices with shape (priors, rows, columns)
+
+        """
+        if priorNames is None: priorNames = s.names
+        bands = [s.sources[name].band for name in priorNames]
+
+        xOff, yOff, xN, yN = windowOffsets(extent, s.xMin, s.yMax, s.dx, s.dy)
+        return readWindow(s.path, xOff, yOff, xN, yN, band=bands)
+
+
+class PriorSlack(object):
+    """The PriorSlack object holds, for each pixel of a region, the raw edge
+    indices of several Priors together with the availability of the pixel at
+    the time the slack was computed (see ExclusionCalculator.computeSlack)
+
+    * A pixel's edge index is the 'slack' of the pixel with respect to a 
+      Prior, since it remains available for every setback exclusion below the
+      Prior's value at that index
+    * Once computed, any combination of thresholds for the contained Priors
+      can be evaluated without reading or warping any raster data
+    * Individual bands are available as PriorSource objects using the 
+      PriorSlack[<name>] convention
+    """
+    def __init__(s, path):
+        """Initialize a PriorSlack object by passing it a path on disk"""
+        ds = gk.raster.loadRaster(path)
+        ri = gk.raster.rasterInfo(ds)
+
+        if ri.meta.get("GLAES_PRIOR_SLACK", "NO") != "YES": raise PriorSource._LoadFail()
+
+        s.path = path
+        s.srs = ri.srs
+        s.bounds = ri.bounds
+        s.dx = ri.dx
+        s.dy = ri.dy
+        s.regionPixels = int(ri.meta["REGION_PIXELS"])
+
+        s.sources = OrderedDict()
+        for b in range(1, ds.RasterCount):
+            p = PriorSource(path, band=b)
+            s.sources[p.displayName] = p
+
+        # The last band holds the availability
+        data = ds.ReadAsArray()
+        s.indices = data[:-1]
+        s.weights = data[-1]
+
+    @property
+    def names(s):
+        """The names of the Priors in the slack, in band order"""
+        return list(s.sources.keys())
+
+    def __getitem__(s, prior):
+        return s.sources[prior]
+
+    def availability(s, exclusions):
+        """Evaluates the availability matrix which results from excluding each 
+        of the given Priors by the given values
+
+        Parameters:
+        -----------
+        exclusions : dict
+            The Priors and values to exclude
+            * Keys are Prior names
+            * Values are the exact value, or value range to exclude, following
+              the conventions of ExclusionCalculator.excludePrior
+
+        Returns:
+        --------
+        numpy.ndarray of uint8 availability values (0-100)
+
+        """
+        excluded = np.zeros(s.weights.shape, dtype=bool)
+        for name, value in exclusions.items():
+            prior = s.sources[name]
+            try:
+                v1, v2 = value
+            except TypeError:
+                v1, v2 = value, value
+
+            low = -np.inf if v1 is None else prior.valueToIndex(v1)
+            high = np.inf if v2 is None else prior.valueToIndex(v2)
+
+            # The no-data index is never excluded, as in excludePrior
+            indices = s.indices[s.names.index(name)]
+            excluded |= (indices >= low) & (indices <= high) & (indices != prior.rawNoData)
+
+        result = s.weights.copy()
+        result[excluded] = 0
+        return result
+
+    def percentAvailable(s, exclusions):
+        """The percent of the region which remains available after the given 
+        exclusions (see PriorSlack.availability)"""
+        return s.availability(exclusions).sum(dtype=np.int64) / s.regionPixels
+
+    def areaAvailable(s, exclusions):
+        """The area of the region which remains available after the given 
+        exclusions (see PriorSlack.availability)
+            * Units are defined by the srs of the slack"""
+        return s.availability(exclusions).sum(dtype=np.int64) * s.dx * s.dy / 100
+
+
 # MAKE THE PRIORS!
 Priors = PriorSet(defaultPriorDir)
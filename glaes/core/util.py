@@ -9,4 +9,337 @@ from warnings import warn
 from difflib import SequenceMatcher as SM
 import pandas as pd
 
-class GlaesError(Exception): pass
\ No newline at end of file
+class GlaesError(Exception): pass
+
+def windowOffsets(extent, xMin, yMax, dx, dy):
+    """Computes the pixel window (xOff, yOff, xN, yN) of an extent within a 
+    raster grid defined by its top-left corner and pixel sizes
+
+    * The extent is expected to be in the grid's srs and aligned to it
+    """
+    xOff = int(round((extent.xMin - xMin) / dx))
+    yOff = int(round((yMax - extent.yMax) / dy))
+    xN = int(round((extent.xMax - extent.xMin) / dx))
+    yN = int(round((extent.yMax - extent.yMin) / dy))
+    return xOff, yOff, xN, yN
+
+
+def gridAligned(region, srs, xMin, yMax, dx, dy, tol=1e-6):
+    """Checks if a RegionMask's pixels coincide exactly with the pixels of a 
+    raster grid defined by its srs, top-left corner and pixel sizes"""
+    if not region.srs.IsSame(srs):
+        return False
+    if abs(region.pixelWidth - dx) > tol * dx or abs(region.pixelHeight - dy) > tol * dy:
+        return False
+
+    xO = (region.extent.xMin - xMin) / dx
+    yO = (yMax - region.extent.yMax) / dy
+    return abs(xO - round(xO)) < tol and abs(yO - round(yO)) < tol
+
+
+def readWindow(source, xOff, yOff, xN, yN, band=1, fill=255):
+    """Reads a pixel window from a raster datasource
+
+    * Parts of the window which fall outside of the datasource are given the
+      'fill' value
+    * If 'band' is an integer, a 2D matrix is returned
+    * If 'band' is a list of integers, a 3D array with one layer per band is
+      returned (read in a single pass, which suits pixel-interleaved files)
+    """
+    from osgeo import gdal, gdal_array
+    ds = gdal.Open(source) if isinstance(source, str) else source
+
+    bands = [band, ] if isinstance(band, int) else list(band)
+    dtype = gdal_array.GDALTypeCodeToNumericTypeCode(ds.GetRasterBand(bands[0]).DataType)
+    out = np.full((len(bands), yN, xN), fill, dtype=dtype)
+
+    # Find the part of the window which lies within the datasource
+    x0, y0 = max(xOff, 0), max(yOff, 0)
+    x1, y1 = min(xOff + xN, ds.RasterXSize), min(yOff + yN, ds.RasterYSize)
+
+    if x1 > x0 and y1 > y0:
+        buf = ds.ReadRaster(x0, y0, x1 - x0, y1 - y0, band_list=bands)
+        data = np.frombuffer(buf, dtype=dtype).reshape(len(bands), y1 - y0, x1 - x0)
+        out[:, y0 - yOff:y1 - yOff, x0 - xOff:x1 - xOff] = data
+
+    return out[0] if isinstance(band, int) else out
+
+
+def blockRanges(source, extent, band=1):
+    """Computes the byte ranges of the blocks of a GeoTIFF file which a read of
+    the given extent would touch
+
+    * The extent is expected to be in the raster's srs
+    * Block locations are taken from GDAL's 'TIFF' meta data domain, so other 
+      formats (and sparse blocks) yield no ranges
+
+    Returns:
+    --------
+    list of (offset, length) tuples
+
+    """
+    from osgeo import gdal
+    ds = gdal.Open(source) if isinstance(source, str) else source
+    xO, dx, _, yO, _, dy = ds.GetGeoTransform()
+
+    # Find the pixel window within the raster
+    x0 = max(int(np.floor((extent.xMin - xO) / dx)), 0)
+    x1 = min(int(np.ceil((extent.xMax - xO) / dx)), ds.RasterXSize)
+    y0 = max(int(np.floor((extent.yMax - yO) / dy)), 0)
+    y1 = min(int(np.ceil((extent.yMin - yO) / dy)), ds.RasterYSize)
+    if x1 <= x0 or y1 <= y0:
+        return []
+
+    # Collect the intersecting blocks
+    b = ds.GetRasterBand(band)
+    bx, by = b.GetBlockSize()
+
+    ranges = []
+    for yb in range(y0 // by, (y1 - 1) // by + 1):
+        for xb in range(x0 // bx, (x1 - 1) // bx + 1):
+            offset = b.GetMetadataItem("BLOCK_OFFSET_%d_%d" % (xb, yb), "TIFF")
+            size = b.GetMetadataItem("BLOCK_SIZE_%d_%d" % (xb, yb), "TIFF")
+            if offset is None or size is None or int(size) == 0:
+                continue
+            ranges.append((int(offset), int(size)))
+
+    return ranges
+
+
+def mergeRanges(ranges, gap=0):
+    """Merges overlapping (or nearly adjacent) byte ranges
+
+    * Ranges which are at most 'gap' bytes apart are combined
+    """
+    merged = []
+    for offset, length in sorted(ranges):
+        if merged and offset <= merged[-1][0] + merged[-1][1] + gap:
+            end = max(merged[-1][0] + merged[-1][1], offset + length)
+            merged[-1] = (merged[-1][0], end - merged[-1][0])
+        else:
+            merged.append((offset, length))
+    return merged
+
+
+def _indicateWindow(region, indicate, r0, r1, c0, c1, halo=0):
+    """Evaluates an indication function over a window of a RegionMask's pixels
+
+    * The window is padded by 'halo' (in the RegionMask's srs), within the
+      RegionMask's bounds, and the padding is cropped off afterwards
+    """
+    rows, cols = region.mask.shape
+    haloRows = int(np.ceil(abs(halo) / region.pixelHeight)) + 1 if halo else 0
+    haloCols = int(np.ceil(abs(halo) / region.pixelWidth)) + 1 if halo else 0
+    a0, a1 = max(r0 - haloRows, 0), min(r1 + haloRows, rows)
+    b0, b1 = max(c0 - haloCols, 0), min(c1 + haloCols, cols)
+
+    ext = region.extent
+    pw, ph = region.pixelWidth, region.pixelHeight
+    windowExtent = gk.Extent(ext.xMin + b0 * pw, ext.yMax - a1 * ph, ext.xMin + b1 * pw, ext.yMax - a0 * ph, srs=region.srs)
+    window = gk.RegionMask.fromMask(windowExtent, np.ones((a1 - a0, b1 - b0), dtype=bool))
+
+    return indicate(window)[r0 - a0:r1 - a0, c0 - b0:c1 - b0]
+
+
+def indicateInBlocks(region, indicate, resolutionDiv=1, halo=0, blockRows=None, workers=1):
+    """Evaluates an indication function over a RegionMask in blocks of rows,
+    so that supersampled indications never materialize for the whole region
+
+    * Each block is handed to 'indicate' as its own RegionMask, which is 
+      expected to return the indicated fraction (0-1) of each of its pixels,
+      for instance by supersampling it 'resolutionDiv' times and reducing the
+      result with a block-average
+    * Blocks are padded by 'halo' (in the RegionMask's srs) on both sides, so
+      that buffers reaching across block boundaries are captured, and the 
+      padding is cropped off afterwards
+
+    Parameters:
+    -----------
+    region : geokit.RegionMask
+        The region to indicate on
+
+    indicate : function
+        A function taking a RegionMask and returning a matrix of fractions of 
+        the same shape
+
+    resolutionDiv : int; optional
+        The supersampling factor used by 'indicate'
+        * Only used to choose the default 'blockRows'
+
+    halo : float; optional
+        The distance by which to pad each block, such as a buffer distance
+
+    blockRows : int; optional
+        The number of rows in each block
+        * By default, blocks are sized so that a supersampled block has about
+          as many pixels as the region at its native resolution
+
+    workers : int; optional
+        The number of blocks to evaluate at once, in separate threads
+        * Peak memory grows with the number of workers
+
+    Returns:
+    --------
+    numpy.ndarray of fractions with the RegionMask's shape
+
+    """
+    rows, cols = region.mask.shape
+    if blockRows is None:
+        blockRows = int(np.ceil(rows / resolutionDiv**2))
+    blockRows = max(int(blockRows), 1)
+
+    output = np.zeros((rows, cols))
+
+    def run(r0):
+        r1 = min(r0 + blockRows, rows)
+        output[r0:r1] = _indicateWindow(region, indicate, r0, r1, 0, cols, halo)
+
+    starts = range(0, rows, blockRows)
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(run, starts))
+    else:
+        for r0 in starts:
+            run(r0)
+
+    return output
+
+
+def indicateAdaptive(region, indicate, resolutionDiv, halo=0, tileSize=32):
+    """Evaluates a supersampled indication function only where it matters: 
+    along the boundaries of the indicated areas
+
+    * The indication is first evaluated at the native resolution
+    * Boundary pixels, whose 3x3 neighbourhood contains differing values, are
+      then re-evaluated at the fine resolution, tile by tile, while all other
+      pixels keep their native value
+    * The cost therefore grows with the length of the boundaries, rather than
+      with the region's area
+    * Features which are too small to be seen at the native resolution at all
+      (for example, a polygon which contains no pixel center) are not found
+
+    Parameters:
+    -----------
+    region : geokit.RegionMask
+        The region to indicate on
+
+    indicate : function
+        A function taking a RegionMask and a resolution divisor, and returning
+        the indicated fraction (0-1) of each of the RegionMask's pixels
+
+    resolutionDiv : int
+        The resolution divisor to use at the boundaries
+
+    halo : float; optional
+        The distance by which to pad each tile, such as a buffer distance
+
+    tileSize : int; optional
+        The size (in pixels) of the tiles in which boundary pixels are 
+        re-evaluated
+
+    Returns:
+    --------
+    numpy.ndarray of fractions with the RegionMask's shape
+
+    """
+    from scipy.ndimage import maximum_filter, minimum_filter
+
+    output = np.asarray(indicate(region, 1), dtype=np.float64).copy()
+    if resolutionDiv <= 1:
+        return output
+
+    boundary = maximum_filter(output, size=3, mode='nearest') != minimum_filter(output, size=3, mode='nearest')
+
+    rows, cols = output.shape
+    for r0 in range(0, rows, tileSize):
+        for c0 in range(0, cols, tileSize):
+            r1, c1 = min(r0 + tileSize, rows), min(c0 + tileSize, cols)
+            sel = boundary[r0:r1, c0:c1]
+            if not sel.any(): continue
+
+            fine = _indicateWindow(region, lambda window: indicate(window, resolutionDiv), r0, r1, c0, c1, halo)
+            output[r0:r1, c0:c1][sel] = fine[sel]
+
+    return output
+
+
+def _matchValues(values, value):
+    """Indicates which of an array of values are selected by a value 
+    expression of the form accepted by ExclusionCalculator.excludeRasterType"""
+    if isinstance(value, str):
+        selected = np.zeros(values.shape, dtype=bool)
+        for element in re.sub(r"\s", "", value).split(","):
+            if element == "": continue
+            if element[0] in "[(":
+                if not element[-1] in "])" or element.count("-") != 1:
+                    raise GlaesError("Could not parse value element: '%s'" % element)
+                low, high = element[1:-1].split("-")
+                match = np.ones(values.shape, dtype=bool)
+                if low != "":
+                    match &= values >= float(low) if element[0] == "[" else values > float(low)
+                if high != "":
+                    match &= values <= float(high) if element[-1] == "]" else values < float(high)
+                selected |= match
+            else:
+                selected |= values == float(element)
+        return selected
+
+    if isinstance(value, tuple) and len(value) == 2:
+        low, high = value
+        selected = np.ones(values.shape, dtype=bool)
+        if not low is None: selected &= values >= low
+        if not high is None: selected &= values <= high
+        return selected
+
+    if np.ndim(value) == 0:
+        return values == value
+
+    return np.isin(values, np.asarray(list(value), dtype=np.float64))
+
+
+def compileValueLookup(value, dtype, noData=None, trueValue=True):
+    """Compiles a value expression into a lookup table covering every value of
+    an integer data type
+
+    * The value expression follows ExclusionCalculator.excludeRasterType's
+      'value' argument
+    * The table is indexed by the data's unsigned view, so that for signed 
+      types a matrix is evaluated with a single 'take':
+        table.take(data.view(unsignedType))
+    * Only types of up to 16 bits are supported (256 or 65536 entries)
+
+    Parameters:
+    -----------
+    value : numeric, tuple, iterable, or str
+        The value expression
+
+    dtype : numpy dtype
+        The integer type of the data to evaluate
+
+    noData : int; optional
+        A value which is never selected
+
+    trueValue : optional
+        The value given to selected entries, which also decides the table's 
+        type (for instance, 100 gives a uint8 table of 0 and 100)
+
+    Returns:
+    --------
+    numpy.ndarray : The lookup table
+
+    """
+    dtype = np.dtype(dtype)
+    if not dtype.kind in "ui" or dtype.itemsize > 2:
+        raise GlaesError("Value lookups are only available for integer types of up to 16 bits")
+
+    unsigned = np.dtype("u%d" % dtype.itemsize)
+    values = np.arange(2**(8 * dtype.itemsize), dtype=np.int64).astype(unsigned).view(dtype).astype(np.float64)
+
+    selected = _matchValues(values, value)
+    if not noData is None:
+        selected &= values != noData
+
+    table = np.zeros(values.shape, dtype=np.asarray(trueValue).dtype)
+    table[selected] = trueValue
+    return table
@@ -0,0 +1,554 @@
+from .util import *
+from os import makedirs, stat
+from os.path import isfile, abspath
+from tempfile import gettempdir
+from uuid import uuid4
+from . import geometry
+
+# Vector sources which are already spatially indexed
+_indexedExtensions = [".gpkg", ".fgb", ".sqlite"]
+
+
+def vectorCacheDir():
+    """The default directory in which spatially indexed copies of vector
+    sources are kept
+
+    * Can be changed with the GLAES_VECTOR_CACHE environment variable
+    """
+    from os import environ
+    return environ.get("GLAES_VECTOR_CACHE", join(gettempdir(), "glaes_vector_cache"))
+
+
+def indexedSource(source, cacheDir=None):
+    """Returns a spatially indexed version of a vector source
+
+    * GeoPackage, FlatGeobuf and SQLite sources, as well as shapefiles with a
+      spatial index (.qix or .sbn), are used directly
+    * Otherwise a GeoPackage copy with an R-tree spatial index is made once,
+      and is reused for as long as the source file is unchanged
+
+    Parameters:
+    -----------
+    source : str
+        The path to the vector source
+
+    cacheDir : str; optional
+        The directory to keep indexed copies in
+        * By default, vectorCacheDir() is used
+
+    Returns:
+    --------
+    str : The path to the spatially indexed source
+
+    """
+    from osgeo import gdal
+    from hashlib import md5
+
+    stem, ext = splitext(source)
+    if ext.lower() in _indexedExtensions:
+        return source
+    if ext.lower() == ".shp" and (isfile(stem+".qix") or isfile(stem+".sbn")):
+        return source
+
+    # Name the copy after the source's path, size and modification time
+    info = stat(source)
+    key = md5(("%s|%d|%d"%(abspath(source), info.st_size, info.st_mtime)).encode()).hexdigest()[:16]
+
+    if cacheDir is None: cacheDir = vectorCacheDir()
+    if not isdir(cacheDir): makedirs(cacheDir, exist_ok=True)
+    output = join(cacheDir, "%s_%s.gpkg"%(basename(stem), key))
+
+    if not isfile(output):
+        # Write to a unique temporary name, so that concurrent calls cannot
+        # write into the same file
+        tmp = "%s.%s.tmp.gpkg"%(output, uuid4().hex)
+        gdal.VectorTranslate(tmp, source, format="GPKG",
+                             layerCreationOptions=["SPATIAL_INDEX=YES"])
+        from os import replace
+        replace(tmp, output)
+
+    return output
+
+
+def simplifiedSource(source, tolerance, srs, cacheDir=None, chunkSize=10000, workers=1):
+    """Returns a copy of a vector source whose geometries are simplified to a
+    given tolerance, for use with coarse rasters
+
+    * Geometries are transformed to 'srs' and simplified while preserving
+      topology, so that no vertex moves by more than 'tolerance' (the 
+      Hausdorff distance between each original and simplified geometry is at
+      most 'tolerance')
+    * The length of each line and area of each polygon must stay within 3% 
+      of the original (see glaes.core.geometry.deviation), otherwise a 
+      GlaesError is raised (a warning is given beyond 1%)
+    * Attributes are kept, and the copy is cached per source, srs and 
+      tolerance, for as long as the source file is unchanged
+
+    Parameters:
+    -----------
+    source : str
+        The path to the vector source
+
+    tolerance : float
+        The simplification tolerance, in units of 'srs'
+
+    srs : Anything acceptable to geokit.srs.loadSRS()
+        The srs of the simplified copy
+
+    cacheDir : str; optional
+        The directory to keep simplified copies in
+        * By default, vectorCacheDir() is used
+
+    chunkSize : int; optional
+        The number of features to simplify at once
+
+    workers : int; optional
+        The number of threads to simplify with, when shapely is available
+
+    Returns:
+    --------
+    str : The path to the simplified source
+
+    """
+    from osgeo import ogr, osr
+    from hashlib import md5
+    from os import replace, remove
+
+    srs = gk.srs.loadSRS(srs)
+    info = stat(source)
+    key = md5(("%s|%d|%d|%s|%.17g"%(abspath(source), info.st_size, info.st_mtime,
+                                     srs.ExportToWkt(), tolerance)).encode()).hexdigest()[:16]
+
+    if cacheDir is None: cacheDir = vectorCacheDir()
+    if not isdir(cacheDir): makedirs(cacheDir, exist_ok=True)
+    output = join(cacheDir, "%s_simplified_%s.gpkg"%(basename(splitext(source)[0]), key))
+    if isfile(output): return output
+
+    srcDS = ogr.Open(source)
+    srcLayer = srcDS.GetLayer()
+    defn = srcLayer.GetLayerDefn()
+    transform = None
+    if not srcLayer.GetSpatialRef() is None and not srcLayer.GetSpatialRef().IsSame(srs):
+        transform = osr.CoordinateTransformation(srcLayer.GetSpatialRef(), srs)
+
+    tmp = "%s.%s.tmp.gpkg"%(output, uuid4().hex)
+    dstDS = ogr.GetDriverByName("GPKG").CreateDataSource(tmp)
+    dstLayer = dstDS.CreateLayer(srcLayer.GetName(), srs, srcLayer.GetGeomType(), ["SPATIAL_INDEX=YES"])
+    for i in range(defn.GetFieldCount()):
+        dstLayer.CreateField(defn.GetFieldDefn(i))
+
+    worst = [0]  # the largest relative deviation of any feature
+
+    def flush(features, geoms):
+        simple = geometry.simplify(geoms, tolerance, workers=workers)
+        simple = [g if sg is None or sg.IsEmpty() else sg for g, sg in zip(geoms, simple)]
+
+        # Features which were degenerate to begin with (0/0) are unchanged
+        deviation = np.abs(1 - geometry.deviation(geoms, simple))
+        worst[0] = max(worst[0], np.nanmax(deviation, initial=0))
+
+        dstLayer.StartTransaction()
+        for feature, g in zip(features, simple):
+            out = ogr.Feature(dstLayer.GetLayerDefn())
+            out.SetFrom(feature)
+            out.SetGeometry(g)
+            dstLayer.CreateFeature(out)
+        dstLayer.CommitTransaction()
+
+    features, geoms = [], []
+    for feature in srcLayer:
+        geom = feature.GetGeometryRef()
+        if geom is None: continue
+        geom = geom.Clone()
+        if not transform is None: geom.Transform(transform)
+        features.append(feature)
+        geoms.append(geom)
+        if len(geoms) >= chunkSize:
+            flush(features, geoms)
+            features, geoms = [], []
+    if len(geoms) > 0: flush(features, geoms)
+    del dstDS, srcDS
+
+    if worst[0] > 0.03:
+        remove(tmp)
+        raise GlaesError("Simplified geometries are >3% different from the original. Use a smaller tolerance")
+    elif worst[0] > 0.01:
+        warn("Simplified geometries are slightly different from the original", UserWarning)
+
+    replace(tmp, output)
+    return output
+
+
+def streamFeatures(source, extent, where=None, chunkSize=10000, srs=None):
+    """Streams the geometries of the features of a vector source which
+    intersect an extent, in chunks of bounded size
+
+    * Only features intersecting the extent are read, which is fast when the
+      source is spatially indexed (see indexedSource)
+
+    Parameters:
+    -----------
+    source : str or ogr.DataSource
+        The vector source
+
+    extent : geokit.Extent
+        The extent to search in
+
+    where : str; optional
+        A filtering statement to apply to the source's features
+
+    chunkSize : int; optional
+        The largest number of features to yield at once
+        * If None, all features are yielded at once
+
+    srs : Anything acceptable to geokit.srs.loadSRS(); optional
+        The srs to transform the geometries to
+        * By default, the extent's srs is used
+
+    Yields:
+    -------
+    list of ogr.Geometry
+
+    """
+    from osgeo import ogr, osr
+
+    srs = extent.srs if srs is None else gk.srs.loadSRS(srs)
+
+    ds = ogr.Open(source) if isinstance(source, str) else source
+    layer = ds.GetLayer()
+    layerSRS = layer.GetSpatialRef()
+
+    search = extent if layerSRS is None else extent.castTo(layerSRS)
+    layer.SetSpatialFilterRect(*search.xyXY)
+    if not where is None: layer.SetAttributeFilter(where)
+
+    transform = None
+    if not layerSRS is None and not layerSRS.IsSame(srs):
+        transform = osr.CoordinateTransformation(layerSRS, srs)
+
+    chunk = []
+    for feature in layer:
+        geom = feature.GetGeometryRef()
+        if geom is None: continue
+        geom = geom.Clone()
+        if not transform is None: geom.Transform(transform)
+        chunk.append(geom)
+
+        if not chunkSize is None and len(chunk) >= chunkSize:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+
+def clipBuffer(geom, extent, distance, margin=0):
+    """Buffers a geometry, as it is seen within an extent
+
+    * The geometry is first clipped to the extent padded by the (absolute) 
+      buffer distance, so that GEOS only buffers the part of the geometry which
+      can affect the extent, and the result is then clipped to the extent 
+      itself
+    * Within the extent, the result is identical to buffering the complete 
+      geometry, which can be orders of magnitude slower for huge geometries
+      (such as coastlines, rivers or large protected areas) near small regions
+
+    Parameters:
+    -----------
+    geom : ogr.Geometry
+        The geometry to buffer
+        * Must be in the extent's srs
+
+    extent : geokit.Extent
+        The extent of interest
+
+    distance : float
+        The buffer distance
+        * May be negative, to shrink polygons
+
+    margin : float; optional
+        An additional padding for the first clip, to be safe with respect to 
+        the approximation of round buffer edges
+        * A pixel's width is a good choice
+
+    Returns:
+    --------
+    ogr.Geometry, or None if nothing remains within the extent
+
+    """
+    return clipBuffers([geom], extent, distance, margin)[0]
+
+
+def clipBuffers(geoms, extent, distance, margin=0, workers=1):
+    """Buffers a list of geometries, as they are seen within an extent
+
+    * Works like clipBuffer, but clips and buffers all geometries at once with
+      the vectorized geometry backend (see glaes.core.geometry)
+
+    Returns:
+    --------
+    list of ogr.Geometry, with None for geometries of which nothing remains 
+    within the extent
+
+    """
+    geoms = list(geoms)
+    if len(geoms) == 0: return []
+
+    pad = abs(distance)+margin
+    xMin, yMin, xMax, yMax = extent.xyXY
+
+    # Only clip the geometries which reach beyond the padded extent
+    envelopes = np.array([g.GetEnvelope() for g in geoms])
+    outside = (envelopes[:, 0] < xMin-pad) | (envelopes[:, 1] > xMax+pad) | \
+              (envelopes[:, 2] < yMin-pad) | (envelopes[:, 3] > yMax+pad)
+    if outside.any():
+        sel = np.flatnonzero(outside)
+        clipped = geometry.intersection([geoms[i] for i in sel], extent.pad(pad).box, workers=workers)
+        for i, g in zip(sel, clipped): geoms[i] = g
+
+    keep = [i for i, g in enumerate(geoms) if not g is None and not g.IsEmpty()]
+    output = [None]*len(geoms)
+    if len(keep) == 0: return output
+
+    buffered = geometry.buffer([geoms[i] for i in keep], distance, workers=workers)
+    pairs = [(i, g) for i, g in zip(keep, buffered) if not g is None and not g.IsEmpty()]
+    if len(pairs) == 0: return output
+    keep, buffered = zip(*pairs)
+
+    for i, g in zip(keep, geometry.intersection(buffered, extent.box, workers=workers)):
+        output[i] = g
+    return output
+
+
+# Rough per-unit costs (in seconds) of the buffering methods, used by
+# estimateBufferCosts
+_COST_BUFFER = 2e-6     # per vertex (times log2 of the vertex count)
+_COST_CLIP = 2e-7       # per vertex
+_COST_RASTERIZE = 5e-8  # per vertex
+_COST_PIXEL = 5e-9      # per fine pixel, to burn and reduce
+_COST_EDT = 4e-8        # per fine pixel
+
+
+def _vertexCount(geom):
+    """Counts the vertices of a geometry, including those of its parts"""
+    n = geom.GetGeometryCount()
+    if n == 0: return geom.GetPointCount()
+    return sum(_vertexCount(geom.GetGeometryRef(i)) for i in range(n))
+
+
+def estimateBufferCosts(region, source, buffer, where=None, resolutionDiv=1, sampleSize=500):
+    """Estimates the time needed to indicate a buffered vector source on a
+    RegionMask with each of the buffering methods
+
+    * The features near the region are counted, and the vertices of up to 
+      'sampleSize' of them are counted and extrapolated
+    * Costs are modelled as:
+      - 'geom': buffering every vertex, then rasterizing the buffers
+      - 'clipped': clipping every vertex to the padded region, then buffering 
+        only the part of each geometry near the region (see clipBuffer)
+      - 'area': rasterizing every vertex, then a distance transform over the
+        padded, fine raster
+    * The estimates are rough, and are only meant for choosing between methods
+
+    Parameters:
+    -----------
+    region : geokit.RegionMask
+        The region to indicate on
+
+    source : str or ogr.DataSource
+        The vector source
+
+    buffer : float
+        The buffer distance, in the RegionMask's srs
+
+    where : str; optional
+        A filtering statement to apply to the source's features
+
+    resolutionDiv : int; optional
+        The factor by which the RegionMask's native resolution is divided
+
+    sampleSize : int; optional
+        The number of features to count vertices of
+
+    Returns:
+    --------
+    OrderedDict : The estimated seconds for 'geom', 'clipped' and 'area', along
+    with the 'features' and 'vertices' found
+
+    """
+    from osgeo import ogr
+
+    ds = ogr.Open(source) if isinstance(source, str) else source
+    layer = ds.GetLayer()
+    layerSRS = layer.GetSpatialRef()
+
+    dist = abs(buffer)
+    search = region.extent.pad(dist)
+    if not layerSRS is None: search = search.castTo(layerSRS)
+    layer.SetSpatialFilterRect(*search.xyXY)
+    if not where is None: layer.SetAttributeFilter(where)
+
+    features = layer.GetFeatureCount()
+    sampled, vertices, near = 0, 0, 0
+    xMin, yMin, xMax, yMax = search.xyXY
+    for feature in layer:
+        if sampled >= sampleSize: break
+        geom = feature.GetGeometryRef()
+        if geom is None: continue
+        n = _vertexCount(geom)
+
+        # Assume vertices are spread evenly over the feature's envelope
+        gxMin, gxMax, gyMin, gyMax = geom.GetEnvelope()
+        w, h = max(gxMax-gxMin, 1e-12), max(gyMax-gyMin, 1e-12)
+        overlap = max(0, min(gxMax, xMax)-max(gxMin, xMin))/w * max(0, min(gyMax, yMax)-max(gyMin, yMin))/h
+
+        vertices += n
+        near += n*min(overlap, 1)
+        sampled += 1
+    layer.ResetReading()
+    layer.SetSpatialFilter(None)
+    layer.SetAttributeFilter(None)
+
+    if sampled > 0:
+        vertices = vertices*features/sampled
+        near = near*features/sampled
+
+    rows, cols = region.mask.shape
+    pw = region.pixelWidth/resolutionDiv
+    ph = region.pixelHeight/resolutionDiv
+    pixels = (rows*resolutionDiv+2*dist/ph) * (cols*resolutionDiv+2*dist/pw)
+
+    costs = OrderedDict()
+    costs["geom"] = _COST_BUFFER*vertices*np.log2(vertices+2) + _COST_RASTERIZE*vertices + _COST_PIXEL*pixels
+    costs["clipped"] = _COST_CLIP*vertices + _COST_BUFFER*near*np.log2(near+2) + _COST_RASTERIZE*near + _COST_PIXEL*pixels
+    costs["area"] = _COST_RASTERIZE*vertices + (_COST_PIXEL+_COST_EDT)*pixels
+    costs["features"] = features
+    costs["vertices"] = vertices
+    return costs
+
+
+def chooseBufferMethod(costs, pixelSize, buffer, clipping=True, accuracyFactor=4):
+    """Chooses the cheapest buffering method from the estimates of 
+    estimateBufferCosts
+
+    * 'area' only resolves buffer edges to the pixel size, so unless the 
+      buffer spans many pixels it is only chosen when it is at least 
+      'accuracyFactor' times cheaper than the geometric methods
+
+    Returns:
+    --------
+    str : One of 'geom', 'clipped' or 'area'
+
+    """
+    geomMethod = "clipped" if clipping else "geom"
+    penalty = 1 if abs(buffer) >= 10*pixelSize else accuracyFactor
+    if costs["area"]*penalty < costs[geomMethod]:
+        return "area"
+    return geomMethod
+
+
+def indicateFeaturesStreamed(region, source, where=None, buffer=None, bufferMethod='geom', resolutionDiv=1, chunkSize=10000, cacheDir=None, indexed=True, workers=1):
+    """Indicates the pixels of a RegionMask which are covered by the features
+    of a (large) vector source, while only holding one chunk of features in
+    memory at a time
+
+    * A spatially indexed copy of the source is made once (see indexedSource)
+    * Only features within the region's extent, padded by the buffer, are read
+    * Each chunk is rasterized into the same raster, so peak memory scales
+      with the local feature density rather than the size of the source
+
+    Parameters:
+    -----------
+    region : geokit.RegionMask
+        The region to indicate on
+
+    source : str
+        The path to the vector source
+
+    where : str; optional
+        A filtering statement to apply to the source's features
+
+    buffer : float; optional
+        A buffer to add around the features
+        * Units are in the RegionMask's srs
+
+    bufferMethod : str; optional
+        * If 'geom', each chunk's geometries are buffered before rasterization
+          - Geometries are clipped around the region before buffering (see
+            clipBuffer)
+        * If 'area', the rasterized pixels are grown with a distance transform
+
+    resolutionDiv : int; optional
+        The factor by which to divide the RegionMask's native resolution
+
+    chunkSize : int; optional
+        The largest number of features to hold in memory at once
+
+    cacheDir : str; optional
+        The directory to keep indexed copies in
+
+    indexed : bool; optional
+        If False, the source is read directly instead of through a spatially 
+        indexed copy
+
+    workers : int; optional
+        The number of threads to buffer geometries with, when shapely is 
+        available
+
+    Returns:
+    --------
+    numpy.ndarray of indicated fractions (0-1) with the RegionMask's shape
+
+    """
+    from osgeo import gdal, ogr
+
+    if not bufferMethod in ['geom', 'area']:
+        raise GlaesError("bufferMethod must be 'geom' or 'area'")
+
+    if indexed: source = indexedSource(source, cacheDir)
+    dist = 0 if buffer is None else buffer
+
+    # Make a fine raster, padded so that features outside of the region can
+    # be grown into it
+    pw = region.pixelWidth/resolutionDiv
+    ph = region.pixelHeight/resolutionDiv
+    padX = int(np.ceil(max(dist, 0)/pw)) if bufferMethod == 'area' else 0
+    padY = int(np.ceil(max(dist, 0)/ph)) if bufferMethod == 'area' else 0
+    rows, cols = region.mask.shape
+    rows, cols = rows*resolutionDiv+2*padY, cols*resolutionDiv+2*padX
+
+    ds = gdal.GetDriverByName("MEM").Create("", cols, rows, 1, gdal.GDT_Byte)
+    ds.SetGeoTransform((region.extent.xMin-padX*pw, pw, 0, region.extent.yMax+padY*ph, 0, -ph))
+    ds.SetProjection(region.srs.ExportToWkt())
+
+    # Rasterize chunk by chunk
+    for chunk in streamFeatures(source, region.extent.pad(max(dist, 0)), where=where, chunkSize=chunkSize, srs=region.srs):
+        if dist != 0 and bufferMethod == 'geom':
+            chunk = clipBuffers(chunk, region.extent, dist, margin=max(pw, ph), workers=workers)
+            chunk = [g for g in chunk if not g is None]
+
+        vec = ogr.GetDriverByName("Memory").CreateDataSource("")
+        layer = vec.CreateLayer("", region.srs, ogr.wkbUnknown)
+        for g in chunk:
+            feature = ogr.Feature(layer.GetLayerDefn())
+            feature.SetGeometry(g)
+            layer.CreateFeature(feature)
+
+        gdal.RasterizeLayer(ds, [1], layer, burn_values=[1])
+        del vec
+
+    indicated = ds.ReadAsArray() > 0
+
+    if dist != 0 and bufferMethod == 'area':
+        from scipy.ndimage import distance_transform_edt
+        if dist > 0:
+            indicated = distance_transform_edt(~indicated, sampling=(ph, pw)) <= dist
+        else:
+            indicated = distance_transform_edt(indicated, sampling=(ph, pw)) > -dist
+        indicated = indicated[padY:rows-padY, padX:cols-padX]
+
+    indicated = indicated.astype(np.float64)
+    if resolutionDiv > 1:
+        indicated = gk.util.scaleMatrix(indicated, -resolutionDiv)
+
+    return indicated
@@ -6,6 +6,7 @@ import numpy as np
 import geokit as gk
 import glaes as gl
 import pandas as pd
+import pytest
 
 
 TESTDIR = dirname(__file__)
@@ -138,6 +139,49 @@ def test_ExclusionCalculator_excludeRasterType():
     assert np.isclose(np.nanstd(ec.availability), 41.2754364014)
 
 
+def test_ExclusionCalculator_excludeRasterType_lookup():
+    from glaes.core.util import compileValueLookup
+
+    table = compileValueLookup("[-2),[5-7),12,(22-26],29,33,[40-]", np.uint8)
+    assert table.shape == (256,)
+    assert set(np.flatnonzero(table[:40])) == {0, 1, 5, 6, 12, 23, 24, 25, 26, 29, 33}
+    assert table[40:].all()
+
+    # Signed types are indexed by their unsigned view
+    table = compileValueLookup((-3, 5), np.int16, noData=4, trueValue=np.uint8(100))
+    data = np.array([-4, -3, 0, 4, 5, 6], dtype=np.int16)
+    assert (table.take(data.view(np.uint16)) == [0, 100, 100, 0, 100, 0]).all()
+
+    # The lookup table matches the general evaluation
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeRasterType(clcRaster, "[-2),[5-7),12,(22-26],29,33,[40-]")
+
+    ecGeneral = gl.ExclusionCalculator(aachenShape)
+    ecGeneral.excludeRasterType(clcRaster, "[-2),[5-7),12,(22-26],29,33,[40-]", buffer=0.001)
+    assert np.isclose(ec.percentAvailable, ecGeneral.percentAvailable, atol=0.1)
+
+
+def test_ExclusionCalculator_excludeRasterType_lookupOutside():
+    # A categorical raster without no-data, covering the western half of the
+    # region on a different grid
+    ec = gl.ExclusionCalculator(aachenShape)
+    ext = ec.region.extent.castTo(gk.srs.EPSG4326)
+    xMid = (ext.xMin + ext.xMax) / 2
+    cols, rows = 100, 200
+    ds = gdal.GetDriverByName("MEM").Create("", cols, rows, 1, gdal.GDT_Byte)
+    ds.SetGeoTransform((ext.xMin - 0.1, (xMid - ext.xMin + 0.1) / cols, 0, ext.yMax + 0.1, 0,
+                        -(ext.yMax - ext.yMin + 0.2) / rows))
+    ds.SetProjection(gk.srs.EPSG4326.ExportToWkt())
+    ds.GetRasterBand(1).WriteArray(np.full((rows, cols), 5, dtype=np.uint8))
+
+    # Selecting 0 must not indicate the pixels outside of the source
+    ec.excludeRasterType(ds, "[-2)", resampleAlg='near')
+    assert ec.percentAvailable == 100
+
+    ec.excludeRasterType(ds, "[-2),5", resampleAlg='near')
+    assert 20 < ec.percentAvailable < 80
+
+
 def test_ExclusionCalculator_excludeVectorType():
     # exclude all features directly
     ec = gl.ExclusionCalculator(aachenShape)
@@ -168,6 +212,133 @@ def test_ExclusionCalculator_excludeVectorType():
     assert np.isclose(np.nanstd(ec.availability), 41.45823669)
 
 
+def test_ExclusionCalculator_excludeVectorType_streamed():
+    roads = gl._test_data_["aachenRoads.shp"]
+
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeVectorType(roads, where="type='primary'", buffer=100)
+
+    ecStream = gl.ExclusionCalculator(aachenShape)
+    ecStream.excludeVectorType(roads, where="type='primary'", buffer=100, chunkSize=100,
+                               cacheDir=join(RESULTDIR, "vectorCache"))
+
+    assert np.isclose(ecStream.percentAvailable, ec.percentAvailable, atol=0.5)
+
+    # Geokit arguments cannot be applied while streaming
+    with pytest.raises(gl.util.GlaesError):
+        ecStream.excludeVectorType(roads, buffer=100, chunkSize=100, allTouched=True,
+                                   cacheDir=join(RESULTDIR, "vectorCache"))
+
+
+def test_ExclusionCalculator_excludeVectorType_autoBuffer(caplog):
+    import logging
+    from glaes.core.vectors import estimateBufferCosts
+    roads = gl._test_data_["aachenRoads.shp"]
+
+    ec = gl.ExclusionCalculator(aachenShape)
+    costs = estimateBufferCosts(ec.region, roads, 100, where="type='primary'")
+    assert costs["features"] > 0 and costs["vertices"] > 0
+    assert costs["clipped"] <= costs["geom"]
+
+    with caplog.at_level(logging.INFO, logger="glaes"):
+        ec.excludeVectorType(roads, where="type='primary'", buffer=100, bufferMethod='auto')
+    assert "chose" in caplog.text and "took" in caplog.text
+
+    ecGeom = gl.ExclusionCalculator(aachenShape)
+    ecGeom.excludeVectorType(roads, where="type='primary'", buffer=100, bufferMethod='geom')
+    assert np.isclose(ec.percentAvailable, ecGeom.percentAvailable, atol=1)
+
+
+def test_ExclusionCalculator_excludeVectorType_simplify():
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeVectorType(cddaVector, where="YEAR>2000", simplify=0.25, cacheDir=join(RESULTDIR, "vectorCache"))
+
+    assert np.isclose(np.nanmean(ec.availability), 86.89811707, atol=0.2)
+
+
+def test_ExclusionCalculator_excludeVectorType_exact():
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeVectorType(cddaVector, where="YEAR>2000", buffer=400, exact=True)
+
+    ecFine = gl.ExclusionCalculator(aachenShape)
+    ecFine.excludeVectorType(cddaVector, where="YEAR>2000", buffer=400, resolutionDiv=10)
+
+    assert np.isclose(ec.percentAvailable, ecFine.percentAvailable, atol=0.2)
+    assert np.nanmax(np.abs(ec.availability - ecFine.availability)) <= 10
+
+    # Arguments which would be ignored are rejected
+    for kwargs in [dict(resolutionDiv=3), dict(allTouched=True)]:
+        with pytest.raises(gl.util.GlaesError):
+            ec.excludeVectorType(cddaVector, buffer=400, exact=True, **kwargs)
+
+
+def test_ExclusionCalculator_blockRows():
+    # Vector exclusions
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeVectorType(cddaVector, where="YEAR>2000", buffer=400, bufferMethod='area', resolutionDiv=3)
+
+    ecBlock = gl.ExclusionCalculator(aachenShape)
+    ecBlock.excludeVectorType(cddaVector, where="YEAR>2000", buffer=400, bufferMethod='area', resolutionDiv=3,
+                              blockRows=25, workers=2)
+    assert np.isclose(ecBlock.percentAvailable, ec.percentAvailable, atol=0.1)
+
+    # Raster exclusions
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeRasterType(clcRaster, value=(1, 3), resolutionDiv=3)
+
+    ecBlock = gl.ExclusionCalculator(aachenShape)
+    ecBlock.excludeRasterType(clcRaster, value=(1, 3), resolutionDiv=3, blockRows='auto')
+    assert np.isclose(ecBlock.percentAvailable, ec.percentAvailable, atol=0.1)
+
+
+def test_ExclusionCalculator_adaptive():
+    # Vector exclusions
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeVectorType(cddaVector, where="YEAR>2000", buffer=400, bufferMethod='area', resolutionDiv=4)
+
+    ecAdaptive = gl.ExclusionCalculator(aachenShape)
+    ecAdaptive.excludeVectorType(cddaVector, where="YEAR>2000", buffer=400, bufferMethod='area', resolutionDiv=4,
+                                 adaptive=True)
+    assert np.isclose(ecAdaptive.percentAvailable, ec.percentAvailable, atol=0.3)
+
+    # Raster exclusions
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeRasterType(clcRaster, value=(1, 3), resolutionDiv=4)
+
+    ecAdaptive = gl.ExclusionCalculator(aachenShape)
+    ecAdaptive.excludeRasterType(clcRaster, value=(1, 3), resolutionDiv=4, adaptive=True)
+    assert np.isclose(ecAdaptive.percentAvailable, ec.percentAvailable, atol=0.3)
+
+    # Only boundary pixels are partially available
+    partial = (ecAdaptive._availability > 0) & (ecAdaptive._availability < 100)
+    assert partial.sum() > 0
+
+
+def test_ExclusionCalculator_excludeVectorType_featureBuffers():
+    roads = gl._test_data_["aachenRoads.shp"]
+
+    # Apply a different buffer for each road type
+    mapping = {"motorway": 200, "primary": 100}
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeVectorType(roads, buffer=mapping, bufferField="type")
+
+    # Compare against separate runs
+    ecSep = gl.ExclusionCalculator(aachenShape)
+    for cls, dist in mapping.items():
+        ecSep.excludeVectorType(roads, where="type='%s'" % cls, buffer=dist, bufferMethod='area')
+
+    assert np.isclose(ec.percentAvailable, ecSep.percentAvailable, atol=2)
+
+    # No matching features leaves everything available
+    ecNone = gl.ExclusionCalculator(aachenShape)
+    ecNone.excludeVectorType(roads, where="type='nonexistent'", buffer=mapping, bufferField="type")
+    assert np.isclose(ecNone.percentAvailable, 100)
+
+    # Geokit arguments cannot be applied to feature-dependent buffers
+    with pytest.raises(gl.util.GlaesError):
+        ec.excludeVectorType(roads, buffer=mapping, bufferField="type", allTouched=True)
+
+
 def test_ExclusionCalculator_excludePrior():
     # make a prior source
     pr = gl.core.priors.PriorSource(priorSample)
@@ -187,6 +358,204 @@ def test_ExclusionCalculator_excludePrior():
     assert np.isclose(np.nanstd(ec.availability), 41.84893036)
 
 
+def test_ExclusionCalculator_excludePrior_aligned():
+    # Direct index comparisons on the Prior's grid should match geokit's 
+    # indicateValues, which was used for all Priors before
+    pr = gl.core.priors.PriorSource(priorSample)
+    geom = gk.geom.box(pr.xMax - 5000, pr.yMin + 5000, pr.xMax + 5000, pr.yMin + 15000, srs=pr.srs)
+    outside = join(RESULTDIR, "alignedOutside.shp")
+    gk.vector.createVector([geom, ], output=outside)
+
+    cases = [dict(value=(400, None)), dict(value=(None, 400)), dict(value=(200, 800)),
+             dict(value=(400, None), invert=True), dict(value=(None, 400), invert=True),
+             dict(value=(None, 400), mode="include"), dict(value=(400, None), mode="include")]
+    for region in [aachenShape, outside]:
+        for case in cases:
+            ec = gl.ExclusionCalculator(region)
+            ecRef = gl.ExclusionCalculator(region)
+            if case.get("mode") == "include":
+                ec.excludeVectorType(cddaVector, buffer=400)
+                ecRef.excludeVectorType(cddaVector, buffer=400)
+
+            ec.excludePrior(pr, **case)
+
+            value = ecRef._priorIndexValue(pr, case["value"])
+            areas = ecRef.region.indicateValues(pr.path, value, applyMask=False)
+            ecRef._applyAreas((areas * 100).astype(np.uint8), invert=case.get("invert", False),
+                              mode=case.get("mode", "exclude"))
+
+            assert np.array_equal(ec.availability, ecRef.availability, equal_nan=True)
+
+
+def test_ExclusionCalculator_buildPriorIndexMap():
+    pr = gl.core.priors.PriorSource(priorSample)
+
+    ecWarp = gl.ExclusionCalculator(aachenShape, srs='latlon', pixelRes=0.001)
+    ecWarp.excludePrior(pr, value=(400, None))
+
+    ec = gl.ExclusionCalculator(aachenShape, srs='latlon', pixelRes=0.001)
+    m = ec.buildPriorIndexMap(supersample=2)
+    assert m.x.shape == (4, ) + ec.region.mask.shape
+
+    # Even supersampling should still keep the exact pixel centers
+    cx = m.cx.copy()
+    m1 = ec.buildPriorIndexMap(supersample=1)
+    assert np.allclose(cx, m1.cx)
+    assert np.allclose(m1.x[0], m1.cx)
+    ec.buildPriorIndexMap(supersample=2)
+    ec.excludePrior(pr, value=(400, None))
+
+    assert np.isclose(ec.percentAvailable, ecWarp.percentAvailable, atol=1)
+
+
+def test_ExclusionCalculator_buildRegionPack():
+    pr = gl.core.priors.PriorSource(priorSample)
+    path = join(RESULTDIR, "regionPack.npz")
+
+    ec = gl.ExclusionCalculator(aachenShape, srs='latlon', pixelRes=0.001)
+    ec.buildRegionPack(path, [pr])
+
+    # Exclusions served from the pack should match a direct exclusion
+    ecPack = gl.ExclusionCalculator(aachenShape, srs='latlon', pixelRes=0.001, regionPack=path)
+    ecPack.excludePrior(pr, value=(400, None))
+
+    ec.excludePrior(pr, value=(400, None))
+    assert np.isclose(ecPack.percentAvailable, ec.percentAvailable, atol=1)
+
+    # The pack should not be usable on another region
+    with pytest.raises(gl.util.GlaesError):
+        gl.ExclusionCalculator(aachenShape, regionPack=path)
+
+
+def test_ExclusionCalculator_excludePrior_spatialThresholds():
+    pr = gl.core.priors.PriorSource(priorSample)
+
+    ec400 = gl.ExclusionCalculator(aachenShape)
+    ec400.excludePrior(pr, value=(None, 400))
+    ec800 = gl.ExclusionCalculator(aachenShape)
+    ec800.excludePrior(pr, value=(None, 800))
+
+    # Use a different threshold in each half of the region
+    ec = gl.ExclusionCalculator(aachenShape)
+    left = np.zeros(ec.region.mask.shape, dtype=bool)
+    left[:, :left.shape[1] // 2] = True
+    thresholds = np.where(left, 400.0, 800.0)
+    ec.excludePrior(pr, value=(None, thresholds))
+
+    expected = np.where(left, ec400._availability, ec800._availability)
+    assert (ec._availability == expected).all()
+
+    # NaN thresholds do not exclude
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludePrior(pr, value=(None, np.where(left, 400.0, np.nan)))
+    assert (ec._availability[~left] == ec.region.mask[~left] * 100).all()
+
+    # ...also when inverted
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludePrior(pr, value=(None, np.where(left, 400.0, np.nan)), invert=True)
+    assert (ec._availability[~left] == ec.region.mask[~left] * 100).all()
+
+    ecInv = gl.ExclusionCalculator(aachenShape)
+    ecInv.excludePrior(pr, value=(None, 400), invert=True)
+    assert (ec._availability[left] == ecInv._availability[left]).all()
+
+
+def test_ExclusionCalculator_excludePrior_pyramid():
+    from shutil import copy
+    path = copy(priorSample, join(RESULTDIR, "pyramid_prior.tif"))
+    pr = gl.core.priors.PriorSource(path)
+    pr.buildPyramid(resolutions=(500,))
+    assert 500 in gl.core.priors.PriorSource(path).pyramids
+
+    # The pyramid level should be picked up at a matching resolution
+    ec = gl.ExclusionCalculator(aachenShape, pixelRes=500)
+    assert pr.pyramidLevel(ec.region) is not None
+    ec.excludePrior(pr, value=(None, 400))
+
+    ecFine = gl.ExclusionCalculator(aachenShape)
+    ecFine.excludePrior(pr, value=(None, 400))
+
+    assert np.isclose(ec.percentAvailable, ecFine.percentAvailable, atol=2)
+
+
+def test_ExclusionCalculator_thresholdCurve():
+    pr = gl.core.priors.PriorSource(priorSample)
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeVectorType(cddaVector, where="YEAR>2000")
+
+    values = [200, 400, 800, 1600]
+    curve = ec.thresholdCurve(pr, values)
+    assert list(curve.index) == values
+    assert (np.diff(curve.percentAvailable.values) <= 0).all()
+
+    # Each point should match a regular exclusion
+    for value in values:
+        ecSingle = gl.ExclusionCalculator(aachenShape)
+        ecSingle.excludeVectorType(cddaVector, where="YEAR>2000")
+        ecSingle.excludePrior(pr, value=(None, value))
+
+        assert np.isclose(curve.loc[value, "percentAvailable"], ecSingle.percentAvailable)
+        assert np.isclose(curve.loc[value, "areaAvailable"], ecSingle.areaAvailable)
+
+
+def test_ExclusionCalculator_computeSlack():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = gl.core.priors.PriorSet(join(TESTDIR, "data"))
+    names = ["roads_main_proximity", "settlement_proximity"]
+
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludeVectorType(cddaVector, where="YEAR>2000")
+    slack = ec.computeSlack([ps[n] for n in names], output=join(RESULTDIR, "slack.tif"))
+    assert slack.names == names
+
+    # Evaluating thresholds should match regular exclusions
+    exclusions = {"roads_main_proximity": (None, 400), "settlement_proximity": (None, 1000)}
+    for name, value in exclusions.items():
+        ec.excludePrior(ps[name], value=value)
+
+    assert np.isclose(slack.percentAvailable(exclusions), ec.percentAvailable)
+    assert np.isclose(slack.areaAvailable(exclusions), ec.areaAvailable)
+
+    # Open ranges never exclude Prior no-data, such as outside of its coverage
+    p = ps["roads_main_proximity"]
+    geom = gk.geom.box(p.xMax - 5000, p.yMin + 5000, p.xMax + 5000, p.yMin + 15000, srs=p.srs)
+    region = join(RESULTDIR, "slackOutside.shp")
+    gk.vector.createVector([geom, ], output=region)
+
+    ec = gl.ExclusionCalculator(region)
+    slack = ec.computeSlack([p], output=join(RESULTDIR, "slackOutside.tif"))
+    ec.excludePrior(p, value=(400, None))
+    assert np.isclose(slack.percentAvailable({p.displayName: (400, None)}), ec.percentAvailable)
+
+
+def test_ExclusionCalculator_excludePriorCube():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = gl.core.priors.PriorSet(join(TESTDIR, "data"))
+    cube = ps.buildCube(join(RESULTDIR, "excludePriorCube.tif"))
+
+    exclusions = {"roads_main_proximity": (None, 400), "settlement_proximity": (None, 1000)}
+
+    # Compare against individual exclusions
+    ecSingle = gl.ExclusionCalculator(aachenShape)
+    for name, value in exclusions.items():
+        ecSingle.excludePrior(ps[name], value=value)
+
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludePriorCube(cube, exclusions)
+
+    assert np.isclose(np.nanmean(ec.availability), np.nanmean(ecSingle.availability))
+    assert np.isclose(np.nanstd(ec.availability), np.nanstd(ecSingle.availability))
+
+
+def test_ExclusionCalculator_priorNoData():
+    # Open ended ranges never indicate no-data indices
+    ec = gl.ExclusionCalculator(aachenShape)
+    indices = np.array([0, 3, 254, 255], dtype=np.uint8)
+    assert (ec._indicateIndices(indices, (3, None), noData=255) == [0, 100, 100, 0]).all()
+
+
 def test_ExclusionCalculator_excludeSet():
     ec = gl.ExclusionCalculator(aachenShape)
     exclusion_set = pd.read_csv(gl._test_data_["sample_exclusion_set.csv"])
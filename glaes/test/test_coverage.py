@@ -0,0 +1,53 @@
+import numpy as np
+import geokit as gk
+
+import glaes as gl
+from glaes.core.coverage import ringCoverage, polygonCoverage, indicateFeaturesExact
+
+aachenShape = gl._test_data_["aachenShapefile.shp"]
+cddaVector = gl._test_data_["CDDA_aachenClipped.shp"]
+
+
+def test_ringCoverage():
+    square = np.array([[2, 1], [4, 1], [4, 3], [2, 3]], dtype=float)
+
+    # A square on the grid lines covers whole pixels
+    cov = ringCoverage([(square, True)], 5, 5)
+    assert cov.sum() == 4
+    assert (cov[1:3, 2:4] == 1).all()
+
+    # Orientation does not matter, and holes are subtracted
+    cov = ringCoverage([(square[::-1], True), (square + 0.5, False)], 5, 5)
+    assert np.isclose(cov.sum(), 4 - 2.25)
+    assert np.isclose(cov[1, 2], 0.75)
+    assert np.isclose(cov[1, 3], 0.5)
+    assert np.isclose(cov[2, 3], 0)
+
+    # A triangle's area is split exactly, including beyond the grid
+    triangle = np.array([[-1, 0], [3, 0], [-1, 4]], dtype=float)
+    cov = ringCoverage([(triangle, True)], 3, 3)
+    assert np.isclose(cov[0, 0], 1)
+    assert np.isclose(cov[0, 2], 0.5)
+    assert np.isclose(cov[1, 1], 0.5)
+    assert np.isclose(cov.sum(), 6 - 0.5 - 0.5 - 0.5)
+
+
+def test_polygonCoverage():
+    ext = gk.Extent(0, 0, 100, 100, srs=gk.srs.EPSG3035)
+    a = gk.geom.box(5, 5, 55, 55, srs=gk.srs.EPSG3035)
+    b = gk.geom.box(30, 30, 80, 80, srs=gk.srs.EPSG3035)
+
+    # Overlapping polygons are merged
+    cov = polygonCoverage([a, b], ext, 10, 10)
+    assert np.isclose(cov.sum() * 100, a.Union(b).Area())
+    assert np.isclose(cov[9, 0], 0.25)
+
+
+def test_indicateFeaturesExact():
+    reg = gk.RegionMask.fromVector(aachenShape)
+    exact = indicateFeaturesExact(reg, cddaVector)
+    fine = reg.indicateFeatures(cddaVector, resolutionDiv=10, applyMask=False)
+
+    assert exact.shape == reg.mask.shape
+    assert np.abs(exact - fine).max() < 0.1
+    assert np.isclose(exact.mean(), fine.mean(), rtol=0.01)
@@ -6,7 +6,7 @@ import geokit as gk
 import pytest
 
 import glaes as gl
-from glaes.core.priors import PriorSource, PriorSet
+from glaes.core.priors import PriorSource, PriorSet, PriorCube, PriorHistograms, PriorBitmapIndex, TiledPriorSource, buildDistancePrior, bitmapAvailability
 
 TESTDIR = dirname(__file__)
 DATADIR = join(TESTDIR, "data")
@@ -61,6 +61,14 @@ def test_Prior_valueOnEdge():
     print("Prior_valueOnEdge is trivial")
 
 
+def _partlyCovered(p, name):
+    """Makes a region which reaches beyond the coverage of a Prior"""
+    geom = gk.geom.box(p.xMax - 5000, p.yMin + 5000, p.xMax + 5000, p.yMin + 15000, srs=p.srs)
+    path = join(RESULTDIR, name)
+    gk.vector.createVector([geom, ], output=path)
+    return path
+
+
 def test_Prior_generateRaster():
     p = PriorSource(priorSample)
 
@@ -78,6 +86,25 @@ def test_Prior_generateRaster():
                                   4069500.0, 3101000.0)).all()
     assert ri.dtype == gdal.GDT_Float64
 
+    # Test a lazy generation
+    r = p.generateRaster(extent=ext, lazy=True)
+    lazyMat = gk.raster.extractMatrix(r)
+    assert lazyMat.shape == mat.shape
+    assert np.isclose(lazyMat, mat).all()
+    assert r.GetRasterBand(1).GetNoDataValue() == p.noData
+
+    # The raw no-data index maps to the no-data value, not an interpolated one
+    lookup = p.valueLookup()
+    del lookup[p.rawNoData]
+    r = p.lookupRaster(ext, lookup)
+    raw = p.extractWindow(ext.castTo(p.srs).fit((p.dx, p.dy)))
+    lazyMat = gk.raster.extractMatrix(r)
+    assert (lazyMat[raw == p.rawNoData] == p.noData).all()
+
+    # Mutation arguments cannot be applied lazily
+    with pytest.raises(gl.util.GlaesError):
+        p.generateRaster(extent=ext, lazy=True, processor=None)
+
 
 def test_Prior_generateVector():
     # generateVector(s, extent, value, output=None)
@@ -99,12 +126,162 @@ def test_Prior_generateVector():
 
     assert np.isclose(g.Area(), 1851537325.6536)
 
+    # Test a contour-based generation
+    v = p.generateVector(ext, value=4000, method='contour',
+                         output=join(RESULTDIR, "generatedVector3.shp"))
+    g = gk.vector.extractFeature(v, onlyGeom=True)
+
+    assert np.isclose(g.Area(), 1684940000.0, rtol=0.01)
+
+    # Test a tiled contour-based generation
+    v = p.generateVector(ext, value=5500, method='contour', tileSize=100)
+    gTiled = gk.vector.extractFeature(v, onlyGeom=True)
+    v = p.generateVector(ext, value=5500, method='contour')
+    g = gk.vector.extractFeature(v, onlyGeom=True)
+
+    assert np.isclose(gTiled.Area(), g.Area())
+    assert np.isclose(g.Area(), 1851537325.6536, rtol=0.02)
+
+    # Values beyond the last edge never enclose untouched pixels
+    v = p.generateVector(ext, value=p.edges.max(), method='contour')
+    gLast = gk.vector.extractFeature(v, onlyGeom=True)
+    v = p.generateVector(ext, value=p.edges.max() * 10, method='contour')
+    gBeyond = gk.vector.extractFeature(v, onlyGeom=True)
+    assert np.isclose(gBeyond.Area(), gLast.Area())
+
 
 @pytest.mark.skip(reason="Todo")
 def test_Prior_extractValues():
     print("Prior_extractValues is trivial")
 
 
+def test_Prior_saveFlat():
+    p = PriorSource(priorSample)
+    header = p.saveFlat(RESULTDIR)
+
+    pf = PriorSource(header)
+    assert pf.displayName == p.displayName
+    assert np.isclose(pf.edges, p.edges).all()
+
+    # Windows are served from the memory-mapped store
+    ext = gk.Extent.load(aachenShape).castTo(gk.srs.EPSG3035).fit(100)
+    window = pf.extractWindow(ext)
+    assert isinstance(window.base, np.memmap) or isinstance(window, np.memmap)
+    assert (window == p.extractWindow(ext)).all()
+
+    # Point values match
+    pts = [(6.0, 50.75), (6.1, 50.8)]
+    assert np.isclose(pf.extractValues(pts, pointSRS='latlon'),
+                      p.extractValues(pts, pointSRS='latlon')).all()
+
+
+def test_Prior_buildBitmapIndex():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = PriorSet(DATADIR)
+    roads = ps["roads_main_proximity"].buildBitmapIndex(RESULTDIR, blockSize=128)
+    settlements = ps["settlement_proximity"].buildBitmapIndex(RESULTDIR, blockSize=128)
+    assert isinstance(roads, PriorBitmapIndex)
+
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludePrior(ps["roads_main_proximity"], value=(None, 400))
+    assert np.isclose(roads.percentAvailable(ec.region, (None, 400)), ec.percentAvailable)
+
+    ec.excludePrior(ps["settlement_proximity"], value=(None, 1000))
+    percent, area = bitmapAvailability(ec.region, {roads: (None, 400), settlements: (None, 1000)})
+    assert np.isclose(percent, ec.percentAvailable)
+    assert np.isclose(area, ec.areaAvailable)
+
+    # Blocks containing no-data never exclude it
+    region = _partlyCovered(ps["roads_main_proximity"], "bitmapOutside.shp")
+    for value in [(400, None), (None, 400)]:
+        ec = gl.ExclusionCalculator(region)
+        ec.excludePrior(ps["roads_main_proximity"], value=value)
+        assert np.isclose(roads.percentAvailable(ec.region, value), ec.percentAvailable)
+
+
+def test_TiledPriorSource():
+    from os import makedirs
+    p = PriorSource(priorSample)
+
+    # Split the sample prior into two tiles
+    directory = join(RESULTDIR, "tiledPrior", p.displayName)
+    makedirs(directory, exist_ok=True)
+    ri = gk.raster.rasterInfo(priorSample)
+    half = ri.xWinSize // 2
+    tiles = [join(directory, "tile_%d.tif" % i) for i in range(2)]
+    gdal.Translate(tiles[0], priorSample, srcWin=[0, 0, half, ri.yWinSize])
+    gdal.Translate(tiles[1], priorSample, srcWin=[half, 0, ri.xWinSize - half, ri.yWinSize])
+
+    tp = TiledPriorSource(tiles)
+    assert tp.displayName == p.displayName
+    assert np.isclose(tp.edges, p.edges).all()
+
+    # Only intersecting tiles are selected
+    ext = gk.Extent.load(aachenShape).castTo(gk.srs.EPSG3035).fit(100)
+    assert len(tp.tilesFor(ext)) == 2
+    left = gk.Extent(tp.xMin, tp.yMin, tp.xMin + 1000, tp.yMin + 1000, srs=tp.srs)
+    assert tp.tilesFor(left) == tiles[:1]
+
+    assert (tp.extractWindow(ext) == p.extractWindow(ext)).all()
+
+    # Pyramids are built through the tiles
+    pyramidTiled = tp.buildPyramid(resolutions=(500,), directory=join(RESULTDIR, "tiledPrior"))[0]
+    pyramid = p.buildPyramid(resolutions=(500,), directory=RESULTDIR)[0]
+    assert (gdal.Open(pyramidTiled).ReadAsArray() == gdal.Open(pyramid).ReadAsArray()).all()
+
+    # Tiles in a sub-directory are grouped by a PriorSet
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = PriorSet(join(RESULTDIR, "tiledPrior"))
+    assert isinstance(ps[p.displayName], TiledPriorSource)
+
+    # Same-named files which are not declared as tiles overwrite each other
+    directory = join(RESULTDIR, "duplicatePrior")
+    makedirs(directory, exist_ok=True)
+    for i in range(2):
+        gdal.Translate(join(directory, "copy_%d.tif" % i), priorSample)
+    with pytest.warns(UserWarning, match="Overwriting"):
+        ps = PriorSet(directory)
+    assert not isinstance(ps[p.displayName], TiledPriorSource)
+
+    # Single files in sub-directories are not loaded
+    directory = join(RESULTDIR, "loneSubdirectory")
+    makedirs(join(directory, "sub"), exist_ok=True)
+    gdal.Translate(join(directory, "sub", "lone.tif"), priorSample)
+    ps = PriorSet(directory)
+    assert not hasattr(ps, p.displayName)
+
+    # In-memory virtual rasters are released with the Prior
+    vrts = [tp.path, tp.sourceFor(left)]
+    del tp
+    assert all(gdal.VSIStatL(v) is None for v in vrts)
+
+
+def test_buildDistancePrior():
+    roads = gl._test_data_["aachenRoads.shp"]
+    region = gk.RegionMask.load(aachenShape, srs=gk.srs.EPSG3035, pixelRes=100)
+
+    p = buildDistancePrior(region, roads, join(RESULTDIR, "distancePrior.tif"), "roads_distance")
+    assert p.isDistance
+    assert np.isclose(p.scale, 0.1)
+
+    # Arbitrary thresholds are exact
+    assert p.containsValue(1234.5)
+    assert p.valueOnEdge(1234.5)
+    assert np.isclose(p.valueToIndex(1234.5), 12345)
+
+    # Raw values are converted to distances
+    raw = p.extractWindow(region.extent)
+    assert (raw[region.mask] < 65535).all()
+    assert np.isclose(p.rawToValue(raw[region.mask]).min(), 0)
+
+    # Vectors are polygonized directly
+    v = p.generateVector(region.extent, 350)
+    g = gk.vector.extractFeature(v, onlyGeom=True)
+    assert g.Area() > 0
+
+
 def test_PriorSet___init__():
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
@@ -116,14 +293,35 @@ def test_PriorSet___init__():
     assert "settlement_proximity" in keys, "Prior inclusion"
 
 
-@pytest.mark.skip(reason="Todo")
 def test_PriorSet_loadDirectory():
-    print("PriorSet__loadDirectory is implicity tested")
+    from os import makedirs
+    import json
+    directory = join(RESULTDIR, "loadDirectory")
+    makedirs(directory, exist_ok=True)
+
+    # Unrelated JSON files are skipped like other unloadable files
+    with open(join(directory, "manifest.json"), "w") as fo:
+        json.dump({"regions": [1, 2]}, fo)
+    with open(join(directory, "broken.json"), "w") as fo:
+        fo.write("{not json")
+    with open(join(directory, "list.json"), "w") as fo:
+        json.dump([1, 2], fo)
+
+    PriorSource(priorSample).saveFlat(directory)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = PriorSet(directory)
+    assert list(ps._sources.keys()) == [PriorSource(priorSample).displayName]
 
 
-@pytest.mark.skip(reason="Todo")
 def test_PriorSet_regionIsOkay():
-    print("PriorSet_regionIsOkay not tested")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = PriorSet(DATADIR)
+
+    region = gk.RegionMask.load(aachenShape, srs=gk.srs.EPSG3035, pixelRes=100)
+    assert ps.regionIsOkay(region)
 
 
 @pytest.mark.skip(reason="Todo")
@@ -141,6 +339,86 @@ def test_PriorSet___getitem__():
     print("PriorSet___getitem__ not tested")
 
 
+def test_PriorSet_prefetch():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = PriorSet(DATADIR)
+
+    ext = gk.Extent.load(aachenShape)
+    plan = ps.prefetch([ext], background=False, method="read")
+    assert len(plan.ranges) == 2
+    assert plan.nbytes > 0
+    assert plan.thread is None
+
+    # The ranges lie within the files
+    from os.path import getsize
+    for f, ranges in plan.ranges.items():
+        assert all(o + n <= getsize(f) for o, n in ranges)
+
+    plan = ps.prefetch([ext], background=True)
+    plan.thread.join()
+
+
+def test_PriorSet_buildRegionHistograms():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = PriorSet(DATADIR)
+
+    hist = ps.buildRegionHistograms(aachenShape, join(RESULTDIR, "regionHistograms.csv"))
+    assert isinstance(hist, PriorHistograms)
+    assert len(hist.regions) == 1
+    assert set(hist.priors) == {"roads_main_proximity", "settlement_proximity"}
+
+    # Single prior questions are exact
+    ec = gl.ExclusionCalculator(aachenShape)
+    ec.excludePrior(ps["roads_main_proximity"], value=(None, 400))
+    pa = hist.percentAvailable({"roads_main_proximity": (None, 400)})
+    assert np.isclose(pa.lower.iloc[0], ec.percentAvailable)
+    assert np.isclose(pa.upper.iloc[0], ec.percentAvailable)
+
+    # Multiple priors are bounded
+    exclusions = {"roads_main_proximity": (None, 400), "settlement_proximity": (None, 1000)}
+    ec.excludePrior(ps["settlement_proximity"], value=(None, 1000))
+    pa = hist.percentAvailable(exclusions)
+    assert pa.lower.iloc[0] <= ec.percentAvailable + 1e-9
+    assert pa.upper.iloc[0] >= ec.percentAvailable - 1e-9
+
+
+def test_PriorHistograms_noData():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = PriorSet(DATADIR)
+    p = ps["roads_main_proximity"]
+    region = _partlyCovered(p, "histogramsOutside.shp")
+
+    # No-data pixels are never excluded, as in excludePrior
+    hist = ps.buildRegionHistograms(region, join(RESULTDIR, "regionHistogramsOutside.csv"),
+                                    priorNames=[p.displayName])
+    for value in [(400, None), (None, 400)]:
+        ec = gl.ExclusionCalculator(region)
+        ec.excludePrior(p, value=value)
+        pa = hist.percentAvailable({p.displayName: value})
+        assert np.isclose(pa.lower.iloc[0], ec.percentAvailable)
+
+
+def test_PriorSet_buildCube():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ps = PriorSet(DATADIR)
+
+    cube = ps.buildCube(join(RESULTDIR, "priorCube.tif"))
+    assert isinstance(cube, PriorCube)
+    assert set(cube.names) == {"roads_main_proximity", "settlement_proximity"}
+
+    # Cube windows should match the individual priors
+    ext = gk.Extent.load(aachenShape).castTo(gk.srs.EPSG3035).fit(100)
+    window = cube.extractWindow(ext)
+    assert window.shape[0] == 2
+    for i, name in enumerate(cube.names):
+        assert (window[i] == ps[name].extractWindow(ext)).all()
+        assert np.isclose(cube[name].edges, ps[name].edges).all()
+
+
 @pytest.mark.skip(reason="Todo")
 def test_PriorSet_combinePriors():
     print("PriorSet_combinePriors not tested")
@@ -0,0 +1,101 @@
+from os.path import join, dirname, isfile
+import numpy as np
+import geokit as gk
+import pytest
+
+import glaes as gl
+from glaes.core.vectors import indexedSource, streamFeatures, clipBuffer, simplifiedSource
+
+TESTDIR = dirname(__file__)
+RESULTDIR = join(TESTDIR, "results")
+
+aachenShape = gl._test_data_["aachenShapefile.shp"]
+roadsVector = gl._test_data_["aachenRoads.shp"]
+
+
+def test_indexedSource():
+    path = indexedSource(roadsVector, cacheDir=join(RESULTDIR, "vectorCache"))
+    assert path.endswith(".gpkg")
+    assert isfile(path)
+
+    # The copy is reused
+    assert indexedSource(roadsVector, cacheDir=join(RESULTDIR, "vectorCache")) == path
+
+
+def test_streamFeatures():
+    ext = gk.Extent.load(aachenShape).castTo(gk.srs.EPSG3035)
+    chunks = list(streamFeatures(roadsVector, ext, where="type='primary'", chunkSize=100))
+
+    assert all(len(c) <= 100 for c in chunks)
+    assert sum(len(c) for c in chunks) > 0
+
+
+def test_simplifiedSource():
+    cacheDir = join(RESULTDIR, "vectorCache")
+    path = simplifiedSource(roadsVector, 20, gk.srs.EPSG3035, cacheDir=cacheDir)
+    assert isfile(path)
+    assert simplifiedSource(roadsVector, 20, gk.srs.EPSG3035, cacheDir=cacheDir) == path
+
+    original = gk.vector.extractFeatures(roadsVector, srs=gk.srs.EPSG3035)
+    simple = gk.vector.extractFeatures(path)
+    assert simple.shape[0] == original.shape[0]
+    assert (simple["type"].values == original["type"].values).all()
+
+    # Fewer vertices, nearly the same length
+    nOriginal = sum(g.GetPointCount() for g in original.geom)
+    nSimple = sum(g.GetPointCount() for g in simple.geom)
+    assert nSimple < nOriginal
+    lengths = sum(g.Length() for g in simple.geom) / sum(g.Length() for g in original.geom)
+    assert 0.97 < lengths <= 1
+
+    # Areas which grow too much are rejected as well
+    x, y = 4040000, 3060000
+    notched = gk.geom.polygon([(x, y), (x + 100, y), (x + 100, y + 100), (x + 55, y + 100), (x + 50, y + 20),
+                               (x + 45, y + 100), (x, y + 100), (x, y)], srs=gk.srs.EPSG3035)
+    source = join(RESULTDIR, "notched.shp")
+    gk.vector.createVector([notched, ], output=source)
+    with pytest.raises(gl.util.GlaesError):
+        simplifiedSource(source, 85, gk.srs.EPSG3035, cacheDir=cacheDir)
+
+
+def test_clipBuffer():
+    ext = gk.Extent(4040000, 3060000, 4045000, 3065000, srs=gk.srs.EPSG3035)
+
+    # A long line which passes near the extent
+    line = gk.geom.line([(3900000, 3059000), (4200000, 3059500)], srs=gk.srs.EPSG3035)
+
+    clipped = clipBuffer(line, ext, 2000, margin=100)
+    full = line.Buffer(2000).Intersection(ext.box)
+    assert np.isclose(clipped.Area(), full.Area(), rtol=1e-6)
+
+    # Nothing remains when the buffer does not reach the extent
+    assert clipBuffer(line, ext, 500) is None
+
+
+def test_geometry():
+    from glaes.core import geometry
+
+    square = gk.geom.box(0, 0, 10, 10, srs=gk.srs.EPSG3035)
+    line = gk.geom.line([(0, 0), (10, 0)], srs=gk.srs.EPSG3035)
+    geoms = [square, line]
+
+    # Buffers match OGR's
+    buffered = geometry.buffer(geoms, 2)
+    assert np.allclose([g.Area() for g in buffered], [g.Buffer(2).Area() for g in geoms])
+    assert buffered[0].GetSpatialReference().IsSame(gk.srs.EPSG3035)
+
+    # Per-geometry distances and threads
+    buffered = geometry.buffer(geoms*10, np.arange(20)+1, workers=4)
+    assert np.allclose([g.Area() for g in buffered],
+                       [g.Buffer(float(d)).Area() for g, d in zip(geoms*10, np.arange(20)+1)])
+
+    assert np.allclose(geometry.area(geoms), [100, 0])
+    assert np.allclose(geometry.length(geoms), [40, 10])
+
+    other = gk.geom.box(5, 5, 20, 20, srs=gk.srs.EPSG3035)
+    inter = geometry.intersection(geoms, other)
+    assert np.isclose(inter[0].Area(), 25)
+    assert inter[1] is None
+
+    assert np.isclose(geometry.simplify([square], 1)[0].Area(), 100)
+    assert geometry.makeValid([square])[0].IsValid()
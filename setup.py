@@ -15,5 +15,9 @@ setup(
         "pandas",
         "scipy",
         "matplotlib",
-    ]
+        "contourpy",
+    ],
+    extras_require={
+        "fast": ["shapely>=2.0"],
+    }
 )